@@ -116,17 +116,110 @@ class ExcelHandler:
         return excel_files
 
     def fill_column(self, list_input, column_number, start_row, end_row):
+        self.fill_columns({column_number: list_input}, start_row, end_row)
+
+    def fill_columns(self, columns, start_row, end_row):
+        """
+        Метод для заполнения нескольких колонок активного листа за одно открытие и сохранение файла.
+
+        Аргументы:
+        - columns: словарь {номер колонки: список значений}.
+        - start_row: номер первой заполняемой строки.
+        - end_row: номер последней строки, значения после нее отбрасываются.
+
+        Результат:
+        - Каждая колонка заполняется так же, как при вызове fill_column, но файл читается и записывается один раз.
+        """
         wb = openpyxl.load_workbook(self.filename)
         sheet = wb.active
 
-        for i, value in enumerate(list_input, start=start_row):
-            if i > end_row:
-                break
-            if i < start_row + len(list_input):
+        for column_number, list_input in columns.items():
+            for i, value in enumerate(list_input[:max(end_row - start_row + 1, 0)], start=start_row):
                 sheet.cell(row=i, column=column_number).value = value
 
         wb.save(self.filename)
 
+    def write_block(self, rows, start_row, start_column=1):
+        """
+        Метод для записи прямоугольного блока значений на активный лист за одно открытие и сохранение файла.
+
+        Аргументы:
+        - rows: список строк, каждая строка - список значений.
+        - start_row: номер строки для левого верхнего угла блока.
+        - start_column: номер колонки для левого верхнего угла блока.
+        """
+        wb = openpyxl.load_workbook(self.filename)
+        sheet = wb.active
+
+        for i, row in enumerate(rows, start=start_row):
+            for j, value in enumerate(row, start=start_column):
+                sheet.cell(row=i, column=j).value = value
+
+        wb.save(self.filename)
+
+    def write_streaming(self, blocks, template_file=None, header_rows=3, sheet_per_block=True, max_rows=1048576):
+        """
+        Метод для записи большой таблицы в режиме write-only: строки сразу уходят в файл,
+        поэтому расход памяти не растет с количеством строк.
+
+        Аргументы:
+        - blocks: итерируемый набор пар (имя блока, строки), строки - итерируемый набор списков значений.
+          Блоки и строки могут быть генераторами.
+        - template_file: файл-шаблон, из которого копируются первые header_rows строк и ширина колонок
+          (None - без заголовка).
+        - header_rows: количество строк заголовка.
+        - sheet_per_block: True - каждый блок на отдельном листе с именем блока, False - все блоки подряд
+          на одном листе, имя блока добавляется в колонку после значений.
+        - max_rows: максимальное количество строк на листе; при переполнении создается следующий лист.
+
+        Результат:
+        - Создает (перезаписывает) файл self.filename.
+        """
+        header = []
+        widths = {}
+        if template_file is not None:
+            template = openpyxl.load_workbook(template_file)
+            template_sheet = template.active
+            header = [[cell.value for cell in row]
+                      for row in template_sheet.iter_rows(min_row=1, max_row=header_rows)]
+            widths = {letter: dimension.width for letter, dimension in template_sheet.column_dimensions.items()
+                      if dimension.width}
+            template.close()
+
+        wb = Workbook(write_only=True)
+        sheet_names = set()
+
+        def new_sheet(name):
+            # Имя листа Excel: не длиннее 31 символа и без []:*?/\
+            title = "".join(char for char in str(name) if char not in "[]:*?/\\")[:31] or "Sheet"
+            base, number = title, 1
+            while title in sheet_names:
+                number += 1
+                title = f"{base[:31 - len(str(number)) - 1]}_{number}"
+            sheet_names.add(title)
+            sheet = wb.create_sheet(title)
+            for letter, width in widths.items():
+                sheet.column_dimensions[letter].width = width
+            for row in header:
+                sheet.append(row)
+            return sheet
+
+        sheet = None
+        row_count = 0
+        for name, rows in blocks:
+            if sheet_per_block or sheet is None:
+                sheet = new_sheet(name)
+                row_count = len(header)
+            for row in rows:
+                if row_count >= max_rows:
+                    sheet = new_sheet(name)
+                    row_count = len(header)
+                sheet.append(list(row) if sheet_per_block else list(row) + [name])
+                row_count += 1
+        if sheet is None:
+            new_sheet("Sheet")
+        wb.save(self.filename)
+
 
 # Пример использования:
 # excel_handler = ExcelHandler("example.xlsx")
@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from PIL import Image
+import brightnessAnalyzer as ba
+import main as mn
+from imageCache import decoded_image_cache
+
+
+# Эталонные изображения, поставляемые с программами преподавателя
+BENCHMARK_FOLDER = os.path.join("Проги Препода", "FACTS3")
+# Пустой шаблон таблицы для этапа экспорта в Excel
+EXCEL_TEMPLATE = "CopyOfWorkTable_пустая_таблица.xlsx"
+BASELINE_FILE = "benchmark_baseline.json"
+
+# Этапы в порядке выполнения
+STAGES = ["load", "background_estimate", "background_exact", "window_maps", "left_to_right", "right_to_left",
+          "top_to_bottom", "bottom_to_top", "fill_lists", "write_f3f5", "excel_export"]
+
+
+def measure(function, repeat):
+    """
+    Измеряет время выполнения функции.
+
+    Параметры:
+    - function: Функция без аргументов. Перед каждым замером она должна сама сбрасывать кэши, которые влияют на этап.
+    - repeat (int): Количество замеров.
+
+    Возвращает:
+    - seconds (float): Наименьшее время среди замеров.
+    - result: Результат последнего вызова.
+    """
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def prepare_images(input_folder, scales, work_folder):
+    """
+    Собирает список изображений для замеров: эталонные BMP и их увеличенные копии.
+
+    Копии увеличиваются без интерполяции (NEAREST), поэтому граница объекта сохраняется,
+    и записываются в work_folder как черно-белые BMP.
+
+    Параметры:
+    - input_folder (строка): Каталог с эталонными изображениями.
+    - scales (list): Коэффициенты увеличения синтетических копий.
+    - work_folder (строка): Каталог для синтетических копий.
+
+    Возвращает:
+    - images (list): Список пар (название, путь к файлу).
+    """
+    images = []
+    for bmp_filename in sorted(mn.get_bmp_filenames(input_folder), key=mn.extract_number):
+        path = os.path.join(input_folder, bmp_filename)
+        images.append((bmp_filename, path))
+        for scale in scales:
+            with Image.open(path) as image:
+                scaled = image.convert("L").resize((image.width * scale, image.height * scale), Image.NEAREST)
+            scaled_name = f"{os.path.splitext(bmp_filename)[0]}_x{scale}.bmp"
+            scaled_path = os.path.join(work_folder, scaled_name)
+            scaled.save(scaled_path)
+            images.append((scaled_name, scaled_path))
+    return images
+
+
+def benchmark_image(path, work_folder, background_dispersion=20, step_size=4, border_width=40, repeat=3):
+    """
+    Замеряет время каждого этапа обработки одного изображения.
+
+    Этапы трекера - методы track_max_dispersion_points_From_* анализатора (их по очереди вызывает
+    track_max_dispersion_points), каждый вместе с fill_lists своих точек. Они замеряются на уже
+    вычисленных картах дисперсии: построение карт - отдельный этап window_maps.
+
+    Параметры:
+    - path (строка): Путь к изображению.
+    - work_folder (строка): Каталог для выходных файлов F3/F5 и таблицы Excel.
+    - background_dispersion (float): Дисперсия фона.
+    - step_size (int): Шаг между строками и столбцами.
+    - border_width (int): Ширина неисследуемой области.
+    - repeat (int): Количество замеров каждого этапа.
+
+    Возвращает:
+    - stages (dict): {этап: время в секундах}.
+    """
+    folder, image_name = os.path.split(path)
+    stages = {}
+
+    def load():
+        decoded_image_cache.clear()
+        return ba.PixelBrightnessAnalyzer(folder, image_name, "points.txt", work_folder)
+
+    stages["load"], analyzer = measure(load, repeat)
+    stages["background_estimate"], _ = measure(
+        lambda: analyzer.estimate_background_dispersion(80, seed=0), repeat)
+    stages["background_exact"], _ = measure(lambda: analyzer.get_background_dispersion_exact(80), repeat)
+
+    def window_maps():
+        analyzer.window_maps.clear()
+        analyzer.integral_image.tables.clear()
+        return analyzer.get_window_maps(3)
+
+    stages["window_maps"], _ = measure(window_maps, repeat)
+
+    # Стороны обходятся в том же порядке и с теми же аргументами, что в track_max_dispersion_points
+    stages["left_to_right"], left_side = measure(lambda: analyzer.track_max_dispersion_points_From_Left_To_Right(
+        background_dispersion, step_size, border_width), repeat)
+    stages["right_to_left"], right_side = measure(lambda: analyzer.track_max_dispersion_points_From_Right_To_Left(
+        background_dispersion, step_size), repeat)
+    left_points, right_points = left_side[0], right_side[0]
+    if left_points and right_points:
+        stages["top_to_bottom"], top_side = measure(lambda: analyzer.track_max_dispersion_points_From_Top_To_Bottom(
+            background_dispersion, step_size, right_points[0][0] - left_points[0][0], left_points[0][0],
+            left_points[0][1]), repeat)
+        stages["bottom_to_top"], bottom_side = measure(
+            lambda: analyzer.track_max_dispersion_points_From_Bottom_To_Top(
+                background_dispersion, step_size, right_points[-1][0] - left_points[-1][0], left_points[-1][0],
+                left_points[-1][1]), repeat)
+    else:
+        # track_max_dispersion_points без точек слева или справа завершается ошибкой, вертикальных полос нет
+        stages["top_to_bottom"], top_side = 0.0, ([],)
+        stages["bottom_to_top"], bottom_side = 0.0, ([],)
+
+    points = left_points + right_points + top_side[0] + bottom_side[0]
+    stages["fill_lists"], lists = measure(lambda: analyzer.fill_lists(points), repeat)
+
+    def write_f3f5():
+        mn.clear_files("outputF3.txt", "outputF5.txt")
+        mn.write_tuple_F3_data_to_file(lists, "outputF3.txt")
+        mn.write_tuple_F5_data_to_file(lists, "outputF5.txt")
+
+    def excel_export():
+        shutil.copyfile(EXCEL_TEMPLATE, "CopyOfWorkTable.xlsx")
+        mn.final_EXPORT_DATAF3F5_TO_EXEL(1, "CopyOfWorkTable.xlsx")
+
+    # Выходные файлы пишутся в рабочий каталог, шаблон таблицы копируется туда же
+    template = os.path.abspath(EXCEL_TEMPLATE)
+    # contextlib.chdir появился только в Python 3.11, каталог возвращается вручную
+    previous_folder = os.getcwd()
+    os.chdir(work_folder)
+    try:
+        shutil.copyfile(template, EXCEL_TEMPLATE)
+        stages["write_f3f5"], _ = measure(write_f3f5, repeat)
+        stages["excel_export"], _ = measure(excel_export, repeat)
+    finally:
+        os.chdir(previous_folder)
+    return stages
+
+
+def run_benchmark(input_folder=BENCHMARK_FOLDER, scales=(2, 4), repeat=3):
+    """
+    Выполняет замеры для всех эталонных изображений и их синтетических копий.
+
+    Возвращает:
+    - results (dict): Результаты в формате JSON: параметры запуска, время этапов по изображениям
+      и суммарное время этапов (ключ "totals").
+    """
+    images = []
+    with tempfile.TemporaryDirectory() as work_folder:
+        for name, path in prepare_images(input_folder, scales, work_folder):
+            stages = benchmark_image(path, work_folder, repeat=repeat)
+            with Image.open(path) as image:
+                size = list(image.size)
+            images.append({"name": name, "size": size, "stages": stages})
+            print(f"{name}: " + ", ".join(f"{stage} {stages[stage] * 1000:.1f} мс" for stage in STAGES))
+    decoded_image_cache.clear()
+    totals = {stage: sum(image["stages"][stage] for image in images) for stage in STAGES}
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "scales": list(scales),
+        "repeat": repeat,
+        "images": images,
+        "totals": totals,
+    }
+
+
+def compare_with_baseline(results, baseline, tolerance=0.25, min_delta=0.005):
+    """
+    Сравнивает суммарное время этапов с сохраненным базовым запуском.
+
+    Этап считается регрессией, если он стал медленнее больше чем на tolerance (доля)
+    и больше чем на min_delta секунд (чтобы не реагировать на шум коротких этапов).
+
+    Возвращает:
+    - regressions (list): Список строк с описанием регрессий.
+    """
+    regressions = []
+    for stage, seconds in results["totals"].items():
+        baseline_seconds = baseline["totals"].get(stage)
+        if baseline_seconds is None:
+            continue
+        if seconds > baseline_seconds * (1 + tolerance) and seconds - baseline_seconds > min_delta:
+            regressions.append(f"{stage}: {baseline_seconds:.4f} с -> {seconds:.4f} с "
+                               f"(+{(seconds / baseline_seconds - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры времени этапов обработки на эталонных изображениях")
+    parser.add_argument("--input", default=BENCHMARK_FOLDER, help="каталог с эталонными BMP")
+    parser.add_argument("--scales", type=int, nargs="*", default=[2, 4],
+                        help="коэффициенты увеличения синтетических копий")
+    parser.add_argument("--repeat", type=int, default=3, help="количество замеров каждого этапа")
+    parser.add_argument("--output", help="файл для результатов в формате JSON")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help="файл базового запуска")
+    parser.add_argument("--save-baseline", action="store_true", help="сохранить результаты как базовый запуск")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="завершиться с кодом 1, если базового запуска нет (для проверки перед обновлением)")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="допустимое замедление этапа (доля)")
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.input, args.scales, args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        print(f"Базовый запуск сохранен в {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        # Время зависит от машины, поэтому базовый запуск не хранится в репозитории, а создается на ней же
+        print(f"Базовый запуск {args.baseline} не найден, сравнение пропущено. "
+              f"Создайте его командой: python benchmark.py --save-baseline")
+        return 1 if args.require_baseline else 0
+    with open(args.baseline, "r", encoding="utf-8") as file:
+        baseline = json.load(file)
+    regressions = compare_with_baseline(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"Регрессия: {regression}")
+    if not regressions:
+        print("Регрессий нет")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 from PIL import Image
+from imageCache import decoded_image_cache
 import os
 
 class BlackAndWhiteConverter:
@@ -13,6 +14,8 @@ class BlackAndWhiteConverter:
         if not os.path.exists(self.output_folder):
             os.makedirs(self.output_folder)
 
+        # Освобождаем отображенные в память изображения: файлы будут перезаписаны
+        decoded_image_cache.clear()
         files = os.listdir(self.input_folder)
         for file in files:
             if file.endswith(".bmp"):
@@ -20,10 +23,21 @@ class BlackAndWhiteConverter:
                 img = Image.open(img_path)
 
                 # Преобразуем изображение в черно-белое
-                bw_img = img.convert("L")
+                bw_img = self.convert_image(img)
 
                 # Сохраняем черно-белое изображение
                 output_path = os.path.join(self.output_folder, file)
                 bw_img.save(output_path)
                 print(f"Изображение {file} успешно преобразовано в черно-белое и сохранено в {self.output_folder}")
 
+    def convert_image(self, img):
+        """
+        Преобразует изображение в черно-белое (режим "L") в памяти, без записи на диск.
+
+        Параметры:
+        - img (PIL.Image): Исходное изображение.
+
+        Возвращает:
+        - bw_img (PIL.Image): Черно-белое изображение.
+        """
+        return img.convert("L")
@@ -0,0 +1,85 @@
+from PIL import Image
+import mmap
+import numpy as np
+import struct
+
+# Размер заголовков BITMAPFILEHEADER и BITMAPINFOHEADER
+FILE_HEADER_SIZE = 14
+INFO_HEADER_SIZE = 40
+
+
+def read_grayscale_bmp(path):
+    """
+    Отображает в память несжатый 8-битный BMP с серой палитрой, без копирования пикселей через PIL.
+
+    Такие файлы создает BlackAndWhiteConverter. Учитываются порядок строк (снизу вверх или сверху вниз)
+    и выравнивание строк до 4 байт. Файл закрывается сразу, но отображение держит свой дескриптор,
+    пока жив результат: количество одновременно открытых отображений ограничивает DecodedImageCache
+    (max_entries), а тем, кто хранит много изображений дольше кэша, нужно скопировать пиксели.
+
+    Аргументы:
+    - path (строка): Путь к файлу BMP.
+
+    Возвращает:
+    - image (PIL.Image): Изображение в режиме "L", разделяющее память с файлом.
+    - pixels (numpy.ndarray): Буфер яркостей uint8 только для чтения (представление отображенного файла).
+    Если формат файла не подходит или файл не удалось отобразить в память, возвращает None.
+    """
+    try:
+        with open(path, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # Пустой файл или отображение недоступно - изображение читается через PIL
+        return None
+    decoded = map_pixels(data)
+    if decoded is None:
+        # Формат не подходит - дескриптор отображения освобождается сразу
+        data.close()
+    return decoded
+
+
+def map_pixels(data):
+    """
+    Разбирает заголовки BMP и возвращает пиксели как представление содержимого файла, без копирования.
+
+    Аргументы:
+    - data (mmap.mmap или bytes): Содержимое файла.
+
+    Возвращает:
+    - image (PIL.Image): Изображение в режиме "L" над той же памятью.
+    - pixels (numpy.ndarray): Массив яркостей uint8 только для чтения размером высота x ширина (строки сверху вниз).
+    Если формат не подходит, возвращает None.
+    """
+    if len(data) < FILE_HEADER_SIZE + INFO_HEADER_SIZE or data[:2] != b"BM":
+        return None
+    pixel_offset, = struct.unpack_from("<I", data, 10)
+    (header_size, width, height, planes, bits_per_pixel, compression,
+     _, _, _, colors_used, _) = struct.unpack_from("<IiiHHIIiiII", data, FILE_HEADER_SIZE)
+    if header_size < INFO_HEADER_SIZE or width <= 0 or height == 0 or planes != 1:
+        return None
+    if bits_per_pixel != 8 or compression != 0:
+        return None
+
+    # Палитра должна быть серой: индекс пикселя равен его яркости
+    colors_used = colors_used or 256
+    palette_offset = FILE_HEADER_SIZE + header_size
+    if colors_used != 256 or palette_offset + 4 * colors_used > pixel_offset:
+        return None
+    palette = np.frombuffer(data, dtype=np.uint8, count=4 * colors_used, offset=palette_offset).reshape(-1, 4)
+    if not (palette[:, :3] == np.arange(colors_used, dtype=np.uint8)[:, np.newaxis]).all():
+        return None
+
+    rows = abs(height)
+    stride = (width + 3) // 4 * 4  # строки дополняются до кратного 4 байтам
+    if pixel_offset + stride * rows > len(data):
+        return None
+    pixels = np.frombuffer(data, dtype=np.uint8, count=stride * rows, offset=pixel_offset).reshape(rows, stride)
+    pixels = pixels[:, :width]
+    # Положительная высота - строки хранятся снизу вверх
+    orientation = -1 if height > 0 else 1
+    if height > 0:
+        pixels = pixels[::-1]
+
+    buffer = memoryview(data)[pixel_offset:pixel_offset + stride * rows]
+    image = Image.frombuffer("L", (width, rows), buffer, "raw", "L", stride, orientation)
+    return image, pixels
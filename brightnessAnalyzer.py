@@ -1,17 +1,57 @@
 from PIL import Image
+import hashlib
+import numpy as np
 import os
 import random
+import sys
+from statistics import NormalDist
 from tqdm import tqdm
 from work_with_files import workWithFiles
+from integralImage import IntegralImage, clipped_window_sums_direct, tiled_window_maps
+from imageCache import decoded_image_cache
+from instrumentation import instrumentation, timed
 
 
 class PixelBrightnessAnalyzer(workWithFiles):
-    def __init__(self, input_folder, image_name="Image1.bmp", points_file="points1.txt", output_folder="Output"):
+    def __init__(self, input_folder, image_name="Image1.bmp", points_file="points1.txt", output_folder="Output",
+                 image=None, map_cache=None, tile_size=None, tile_workers=1, copy_pixels=False):
+        """
+        Инициализирует объект PixelBrightnessAnalyzer.
+
+        Параметры:
+        - input_folder (строка): Путь к каталогу с входными изображениями.
+        - image_name (строка): Имя файла изображения.
+        - points_file (строка): Имя файла для сохранения точек.
+        - output_folder (строка): Путь к каталогу для выходных файлов.
+        - image (PIL.Image или numpy.ndarray): Уже декодированное изображение. Если передано, файл не читается.
+        - map_cache (WindowMapCache): Дисковый кэш карт средней яркости и дисперсии (None - без кэша).
+        - tile_size (int): Сторона плитки для поплиточного расчета карт больших изображений (None - целиком).
+        - tile_workers (int): Количество потоков для обработки плиток.
+        - copy_pixels (bool): Скопировать пиксели из отображенного в память файла. Нужно, когда одновременно
+          хранится много анализаторов: каждое отображение держит открытый дескриптор файла.
+        """
         self.points_file = points_file
         self.image_name = image_name
         self.input_folder = input_folder
-        self.image = Image.open(os.path.join(input_folder, image_name))
+        if image is None:
+            # Декодированное изображение берется из общего кэша процесса
+            self.image, self.pixels = decoded_image_cache.get(os.path.join(input_folder, image_name))
+            if copy_pixels:
+                self.image, self.pixels = decoded_image_cache.copy_pixels(self.image, self.pixels)
+        else:
+            if isinstance(image, np.ndarray):
+                image = Image.fromarray(image)
+            self.image = image
+            # Декодируем изображение один раз: все окрестности читаются из этого буфера
+            self.pixels = np.ascontiguousarray(self.image, dtype=np.uint8)
         self.output_folder = output_folder
+        self.integral_image = IntegralImage(self.pixels)
+        self.map_cache = map_cache
+        self.tile_size = tile_size
+        self.tile_workers = tile_workers
+        self.window_maps = {}
+        # Количество окрестностей 3x3, вычисленных при следовании по контуру
+        self.evaluated_windows = 0
 
     def get_pixel_brightness(self, x, y, image_name):
         """
@@ -25,13 +65,46 @@ class PixelBrightnessAnalyzer(workWithFiles):
         Возвращает:
         - brightness (int): Яркость пикселя (значение от 0 до 255).
         """
-        img_path = os.path.join(self.input_folder, image_name)
-        img = Image.open(img_path)
-        pixel = img.getpixel((x, y))
+        if image_name != self.image_name:
+            img_path = os.path.join(self.input_folder, image_name)
+            img = decoded_image_cache.get(img_path)[0]
+            return img.getpixel((x, y))
+        instrumentation.count("pixel_reads")
+        height, width = self.pixels.shape[:2]
+        # Отрицательные координаты отсчитываются от края, как в Image.getpixel
+        if x < 0:
+            x += width
+        if y < 0:
+            y += height
+        if not (0 <= x < width and 0 <= y < height):
+            raise IndexError("image index out of range")
         # Яркость пикселя для черно-белого изображения равна значению пикселя
-        brightness = pixel
+        brightness = int(self.pixels[y, x])
         return brightness
 
+    def get_window_brightness(self, x, y, radius, image_name):
+        """
+        Получает яркость пикселей квадратной окрестности (2 * radius + 1) x (2 * radius + 1) вокруг точки.
+
+        Аргументы:
+        x (int): Координата x центрального пикселя.
+        y (int): Координата y центрального пикселя.
+        radius (int): Радиус окрестности (1 для 3x3, 2 для 5x5).
+        image_name (str): Имя файла изображения.
+
+        Возвращает:
+        list: Список яркостей построчно, сверху вниз и слева направо.
+        """
+        height, width = self.pixels.shape[:2]
+        if image_name == self.image_name and radius <= x < width - radius and radius <= y < height - radius:
+            # Окрестность целиком внутри изображения - берем срез буфера
+            instrumentation.count("pixel_reads", (2 * radius + 1) ** 2)
+            return self.pixels[y - radius:y + radius + 1, x - radius:x + radius + 1].ravel().tolist()
+        # У края изображения повторяем поведение попиксельного чтения
+        return [self.get_pixel_brightness(coord_x, coord_y, image_name)
+                for coord_y in range(y - radius, y + radius + 1)
+                for coord_x in range(x - radius, x + radius + 1)]
+
     def get_surrounding_pixel_brightness(self, x, y, image_name):
         """
         Получает яркость 9 соседних пикселей вокруг заданной точки.
@@ -44,20 +117,8 @@ class PixelBrightnessAnalyzer(workWithFiles):
         Возвращает:
         list: Список со значениями яркости 9 соседних пикселей вокруг центрального пикселя.
         """
-        surrounding_pixels_brightness = []
-
-        # Координаты всех 9 пикселей (включая изначальную точку)
-        neighbors_coordinates = [
-            (x - 1, y - 1), (x, y - 1), (x + 1, y - 1),
-            (x - 1, y), (x, y), (x + 1, y),
-            (x - 1, y + 1), (x, y + 1), (x + 1, y + 1)
-        ]
-
-        # Получаем яркость каждого соседнего пикселя
-        for coord_x, coord_y in neighbors_coordinates:
-            brightness = self.get_pixel_brightness(coord_x, coord_y, image_name)
-            surrounding_pixels_brightness.append(brightness)
-        return surrounding_pixels_brightness
+        # Яркость всех 9 пикселей (включая изначальную точку)
+        return self.get_window_brightness(x, y, 1, image_name)
 
     def get_surrounding_pixel_brightness_25(self, x, y, image_name):
         """
@@ -71,22 +132,8 @@ class PixelBrightnessAnalyzer(workWithFiles):
         Возвращает:
         list: Список со значениями яркости 25 соседних пикселей вокруг центрального пикселя.
         """
-        surrounding_pixels_brightness = []
-
-        # Координаты всех 25 пикселей (включая изначальную точку)
-        neighbors_coordinates = [
-            (x - 2, y - 2), (x - 1, y - 2), (x, y - 2), (x + 1, y - 2), (x + 2, y - 2),
-            (x - 2, y - 1), (x - 1, y - 1), (x, y - 1), (x + 1, y - 1), (x + 2, y - 1),
-            (x - 2, y), (x - 1, y), (x, y), (x + 1, y), (x + 2, y),
-            (x - 2, y + 1), (x - 1, y + 1), (x, y + 1), (x + 1, y + 1), (x + 2, y + 1),
-            (x - 2, y + 2), (x - 1, y + 2), (x, y + 2), (x + 1, y + 2), (x + 2, y + 2)
-        ]
-
-        # Получаем яркость каждого соседнего пикселя
-        for coord_x, coord_y in neighbors_coordinates:
-            brightness = self.get_pixel_brightness(coord_x, coord_y, image_name)
-            surrounding_pixels_brightness.append(brightness)
-        return surrounding_pixels_brightness
+        # Яркость всех 25 пикселей (включая изначальную точку)
+        return self.get_window_brightness(x, y, 2, image_name)
 
     def analyze_pixel_and_surroundings(self, x, y, image_name):
         """
@@ -145,11 +192,193 @@ class PixelBrightnessAnalyzer(workWithFiles):
         if n < 2:
             return 0
 
+        instrumentation.count("window_evaluations")
         mean = sum(values) / n
         dispersion = sum((x - mean) ** 2 for x in values) / (n - 1)
 
         return dispersion
 
+    def analyze_points_batch(self, points):
+        """
+        Вычисляет среднюю яркость и дисперсию окрестностей 3x3 и 5x5 сразу для набора точек.
+
+        Окрестность 5x5 всех точек читается из буфера одним обращением, окрестность 3x3 - ее центральная часть.
+        Результаты совпадают с analyze_pixel_and_surroundings(_25) и dispersion_by_brightness_list.
+
+        Аргументы:
+        points (array-like): Массив координат точек размером N x 2 [(x1, y1), (x2, y2), ...].
+
+        Возвращает:
+        mean3, dispersion3, mean5, dispersion5 (numpy.ndarray): Массивы длины N.
+        """
+        windows = self.get_windows_batch(points, 2)
+        mean3, dispersion3 = window_mean_and_dispersion(windows[:, 1:4, 1:4].reshape(len(windows), 9))
+        mean5, dispersion5 = window_mean_and_dispersion(windows.reshape(len(windows), 25))
+        return mean3, dispersion3, mean5, dispersion5
+
+    def get_windows_batch(self, points, radius):
+        """
+        Читает из буфера окрестности (2 * radius + 1) x (2 * radius + 1) сразу для набора точек.
+
+        Отрицательные координаты отсчитываются от края, а выход за изображение вызывает IndexError,
+        как при попиксельном чтении через Image.getpixel.
+
+        Аргументы:
+        points (array-like): Массив координат точек размером N x 2 [(x1, y1), (x2, y2), ...].
+        radius (int): Радиус окрестности (1 для 3x3, 2 для 5x5).
+
+        Возвращает:
+        numpy.ndarray: Массив яркостей (int64) размером N x (2 * radius + 1) x (2 * radius + 1).
+        """
+        points = np.asarray(points, dtype=np.intp).reshape(-1, 2)
+        instrumentation.count("pixel_reads", len(points) * (2 * radius + 1) ** 2)
+        offsets = np.arange(-radius, radius + 1)
+        return self.pixels[points[:, 1, np.newaxis, np.newaxis] + offsets[:, np.newaxis],
+                           points[:, 0, np.newaxis, np.newaxis] + offsets].astype(np.int64)
+
+    def get_window_maps(self, window_size=3):
+        """
+        Возвращает карты средней яркости и дисперсии для всего изображения.
+
+        Аргументы:
+        window_size (int): Нечетный размер окна (3 для F3, 5 для F5 и т.д.).
+
+        Возвращает:
+        mean_map, dispersion_map (numpy.ndarray): Карты размером с изображение, индексируются как [y, x].
+        """
+        if window_size not in self.window_maps:
+            height, width = self.pixels.shape[:2]
+
+            def compute(out=None):
+                # Окна считаются только при промахе кэша карт
+                instrumentation.count("window_evaluations", height * width)
+                if self.tile_size is None:
+                    return self.integral_image.window_maps(window_size)
+                # Большие изображения считаются по плиткам с ореолом, память ограничена размером плитки:
+                # карты пишутся во временные файлы (или файлы кэша), таблицы сумм всего изображения не строятся
+                return tiled_window_maps(self.pixels, window_size, self.tile_size, self.tile_workers, out)
+
+            with instrumentation.stage("window_maps", self.image_name):
+                if self.map_cache is None:
+                    self.window_maps[window_size] = compute()
+                elif self.tile_size is None:
+                    self.window_maps[window_size] = self.map_cache.get_or_compute(
+                        self.get_image_hash(), window_size, compute)
+                else:
+                    # Плитки записываются прямо в файлы кэша
+                    self.window_maps[window_size] = self.map_cache.get_or_fill(
+                        self.get_image_hash(), window_size, self.pixels.shape[:2],
+                        lambda mean_map, dispersion_map: compute((mean_map, dispersion_map)))
+        return self.window_maps[window_size]
+
+    def get_image_hash(self):
+        """
+        Вычисляет хэш содержимого декодированного изображения (размеры и яркости пикселей).
+
+        Возвращает:
+        str: Шестнадцатеричная строка SHA-256.
+        """
+        digest = hashlib.sha256(str(self.pixels.shape).encode())
+        # По строкам, чтобы не копировать большое изображение целиком
+        for row in self.pixels:
+            digest.update(row.tobytes())
+        return digest.hexdigest()
+
+    def exceeds_background(self, dispersions, xs, ys, dispersion_background):
+        """
+        Сравнивает значения карты дисперсии 3x3 с дисперсией фона.
+
+        Значения, отличающиеся от порога меньше чем на погрешность округления, пересчитываются
+        по окрестностям из буфера, чтобы результат совпадал с попиксельным обходом.
+
+        Аргументы:
+        dispersions (numpy.ndarray): Значения карты дисперсии.
+        xs, ys (numpy.ndarray): Координаты соответствующих точек (той же формы).
+        dispersion_background (float): Значение дисперсии фона.
+
+        Возвращает:
+        numpy.ndarray: Маска точек, где дисперсия больше дисперсии фона.
+        """
+        mask = dispersions > dispersion_background
+        near = np.isclose(dispersions, dispersion_background, rtol=1e-9, atol=1e-9)
+        if near.any():
+            windows = self.get_windows_batch(np.column_stack((xs[near], ys[near])), 1)
+            dispersion3 = window_mean_and_dispersion(windows.reshape(len(windows), 9))[1]
+            mask[near] = dispersion3 > dispersion_background
+        return mask
+
+    def find_first_crossings_in_rows(self, dispersion_background, rows, columns):
+        """
+        Для каждой строки находит первую точку (в порядке обхода columns), где дисперсия 3x3 больше дисперсии фона.
+
+        Все строки обрабатываются одновременно по карте дисперсии.
+
+        Аргументы:
+        dispersion_background (float): Значение дисперсии фона.
+        rows (iterable): Координаты y исследуемых строк.
+        columns (iterable): Координаты x в порядке обхода строки.
+
+        Возвращает:
+        list: Список найденных точек [(x1, y1), (x2, y2), ...] в порядке строк.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        columns = np.asarray(columns, dtype=np.intp)
+        if rows.size == 0 or columns.size == 0:
+            return []
+        dispersion_map = self.get_window_maps(3)[1]
+        ys, xs = np.meshgrid(rows, columns, indexing="ij")
+        dispersions = dispersion_map[ys, xs]
+        crossings = self.exceeds_background(dispersions, xs, ys, dispersion_background)
+        first = crossings.argmax(axis=1)
+        points = []
+        for row_index in np.flatnonzero(crossings.any(axis=1)):
+            column_index = first[row_index]
+            # Точка засчитывается, только если ее дисперсия больше начального максимума (0)
+            if dispersions[row_index, column_index] > 0:
+                points.append((int(columns[column_index]), int(rows[row_index])))
+        return points
+
+    def find_first_non_maximum_crossings_in_columns(self, dispersion_background, columns, rows):
+        """
+        Для каждого столбца находит первую точку (в порядке обхода rows), где дисперсия 3x3 больше дисперсии фона,
+        но не больше максимума дисперсии среди предыдущих таких точек столбца (начальный максимум - 0).
+
+        Все столбцы обрабатываются одновременно по карте дисперсии. Столбцы, где сравнение с максимумом
+        неоднозначно из-за округления, пересчитываются по окрестностям из буфера.
+
+        Аргументы:
+        dispersion_background (float): Значение дисперсии фона.
+        columns (iterable): Координаты x исследуемых столбцов.
+        rows (iterable): Координаты y в порядке обхода столбца.
+
+        Возвращает:
+        list: Список найденных точек [(x1, y1), (x2, y2), ...] в порядке столбцов.
+        """
+        columns = np.asarray(columns, dtype=np.intp)
+        rows = np.asarray(rows, dtype=np.intp)
+        if rows.size == 0 or columns.size == 0:
+            return []
+        dispersion_map = self.get_window_maps(3)[1]
+        xs, ys = np.meshgrid(columns, rows, indexing="ij")
+        dispersions = dispersion_map[ys, xs]
+        crossings = self.exceeds_background(dispersions, xs, ys, dispersion_background)
+        selected, previous_max = first_non_maximum(dispersions, crossings)
+        # Неоднозначные сравнения до найденной точки (или по всему столбцу, если точка не найдена)
+        limit = np.where(selected.any(axis=1), selected.argmax(axis=1), rows.size - 1)
+        ambiguous = crossings & np.isclose(dispersions, previous_max, rtol=1e-9, atol=1e-9)
+        ambiguous &= np.arange(rows.size) <= limit[:, np.newaxis]
+        for column_index in np.flatnonzero(ambiguous.any(axis=1)):
+            row_indices = np.flatnonzero(crossings[column_index])
+            points = np.column_stack((np.full(row_indices.size, columns[column_index]), rows[row_indices]))
+            windows = self.get_windows_batch(points, 1)
+            dispersions[column_index, row_indices] = window_mean_and_dispersion(windows.reshape(len(windows), 9))[1]
+            selected[column_index] = first_non_maximum(dispersions[column_index], crossings[column_index])[0]
+        points = []
+        for column_index in np.flatnonzero(selected.any(axis=1)):
+            row_index = selected[column_index].argmax()
+            points.append((int(columns[column_index]), int(rows[row_index])))
+        return points
+
     def analyze_point(self, x, y, image_name):
         """
         Анализирует яркость и дисперсию для заданной точки.
@@ -173,6 +402,7 @@ class PixelBrightnessAnalyzer(workWithFiles):
         print(f"Координаты точки: ({x}, {y}) Яркость: {brightness} Дисперсия: {dispersion}")
         return brightness, dispersion
 
+    @timed("analyze_points")
     def analyze_points_from_file(self, file_name, image_name):
         """
         Анализирует яркость и дисперсию для всех точек, полученных из текстового файла.
@@ -197,6 +427,7 @@ class PixelBrightnessAnalyzer(workWithFiles):
 
         return brightList, dispList
 
+    @timed("background")
     def get_background_dispersion(self, border_width = 80):
         """
         Находит максимальную дисперсию для точек фона в области шириной 10 пикселей сверху изображения.
@@ -227,6 +458,106 @@ class PixelBrightnessAnalyzer(workWithFiles):
         # self.visualize_explored_area(border_width)
         return max_dispersion
 
+    @timed("background")
+    def estimate_background_dispersion(self, border_width=80, sample_size=2000, percentiles=(95, 99),
+                                       confidence=0.95, min_coverage=None, exact=False, seed=None):
+        """
+        Оценивает дисперсию фона по выборке точек из области шириной border_width сверху изображения.
+
+        Область та же, что и в get_background_dispersion. Точки выбираются стратифицированно: область
+        делится на sample_size равных частей (по порядку обхода столбцов) и из каждой берется одна
+        случайная точка, поэтому выборка покрывает всю ширину изображения.
+
+        Мера доверия - покрытие (coverage): с вероятностью confidence максимум выборки не меньше
+        квантиля уровня coverage дисперсии по всей области. Если покрытие меньше min_coverage
+        или exact=True, вычисляется точный максимум по всей области.
+
+        Аргументы:
+        - border_width (int): Ширина исследуемой области сверху изображения.
+        - sample_size (int): Количество точек выборки.
+        - percentiles (tuple): Процентили дисперсии, которые нужно оценить.
+        - confidence (float): Уровень доверия для покрытия и границ процентилей.
+        - min_coverage (float): Минимальное покрытие, при котором точный проход не нужен (None - не проверять).
+        - exact (bool): Всегда вычислять точный максимум.
+        - seed (int): Начальное значение генератора случайных чисел.
+
+        Возвращает:
+        dict: Словарь с ключами
+        - "max": Оценка (или точное значение) максимальной дисперсии фона.
+        - "percentiles": {процентиль: оценка}.
+        - "percentile_bounds": {процентиль: (нижняя граница, верхняя граница)} с уровнем доверия confidence.
+        - "coverage": Покрытие (1.0 для точного прохода).
+        - "sample_size", "band_size": Размер выборки и число точек в области.
+        - "exact" (bool): Получен ли максимум точным проходом.
+        """
+        # Определяем размеры изображения
+        width, height = self.image.size
+        # Окрестность 3x3 читает строку y + 1, поэтому полоса заканчивается на предпоследней строке (как и по x)
+        band_height = min(border_width, height - 1)
+        band_size = (width - 1) * band_height
+        sample_size = min(sample_size, band_size)
+
+        # Стратифицированная выборка номеров точек в порядке обхода (x, затем y)
+        rng = np.random.default_rng(seed)
+        bounds = np.linspace(0, band_size, sample_size + 1).astype(np.int64)
+        positions = bounds[:-1] + (rng.random(sample_size) * (bounds[1:] - bounds[:-1])).astype(np.int64)
+        points = np.column_stack((positions // band_height, positions % band_height))
+        dispersions = np.sort(self.get_dispersions_batch(points))
+
+        # Двусторонние границы процентилей по порядковым статистикам (нормальное приближение)
+        z = NormalDist().inv_cdf((1 + confidence) / 2)
+        estimates = {}
+        estimate_bounds = {}
+        for percentile in percentiles:
+            q = percentile / 100
+            estimates[percentile] = float(np.percentile(dispersions, percentile))
+            spread = z * np.sqrt(sample_size * q * (1 - q))
+            low = int(np.clip(np.floor(sample_size * q - spread), 0, sample_size - 1))
+            high = int(np.clip(np.ceil(sample_size * q + spread), 0, sample_size - 1))
+            estimate_bounds[percentile] = (float(dispersions[low]), float(dispersions[high]))
+
+        result = {
+            "max": float(dispersions[-1]),
+            "percentiles": estimates,
+            "percentile_bounds": estimate_bounds,
+            "coverage": 1.0 if sample_size == band_size else float((1 - confidence) ** (1 / sample_size)),
+            "sample_size": sample_size,
+            "band_size": band_size,
+            "exact": sample_size == band_size,
+        }
+        if not result["exact"] and (exact or (min_coverage is not None and result["coverage"] < min_coverage)):
+            result["max"] = self.get_background_dispersion_exact(border_width)
+            result["coverage"] = 1.0
+            result["exact"] = True
+        return result
+
+    @timed("background")
+    def get_background_dispersion_exact(self, border_width=80, chunk_size=65536):
+        """
+        Вычисляет максимальную дисперсию для всех точек области шириной border_width сверху изображения.
+
+        Результат совпадает с get_background_dispersion, но окрестности читаются из буфера блоками.
+
+        Возвращает:
+        float: Максимальная дисперсия для точек фона.
+        """
+        width, height = self.image.size
+        # Полоса ограничивается высотой изображения так же, как в estimate_background_dispersion
+        ys, xs = np.mgrid[0:min(border_width, height - 1), 0:width - 1]
+        points = np.column_stack((xs.ravel(), ys.ravel()))
+        return float(max(self.get_dispersions_batch(points[start:start + chunk_size]).max()
+                         for start in range(0, len(points), chunk_size)))
+
+    def get_dispersions_batch(self, points):
+        """
+        Вычисляет дисперсию окрестности 3x3 для набора точек.
+
+        Возвращает:
+        numpy.ndarray: Массив дисперсий длины N.
+        """
+        windows = self.get_windows_batch(points, 1)
+        return window_mean_and_dispersion(windows.reshape(len(windows), 9))[1]
+
     def save_explored_area(self, border_width=10, output_file="BackgroungArea.jpg"):
         """
         Сохраняет исследованную область в новом файле с сохранением яркости и цвета каждого пикселя.
@@ -261,6 +592,7 @@ class PixelBrightnessAnalyzer(workWithFiles):
             # Показываем изображение в консоли
             img.show()
 
+    @timed("track")
     def track_max_dispersion_points(self, dispersion_background, step_size=6, border_width=40):
         """
         Отслеживает максимальные точки дисперсии на изображении.
@@ -276,60 +608,9 @@ class PixelBrightnessAnalyzer(workWithFiles):
         - brightness_list_5x5 (list): Список яркостей пикселей (для 5x5 окрестности) для каждой найденной точки.
         - dispersion_list_5x5 (list): Список дисперсий (для 5x5 окрестности) для каждой найденной точки.
         """
-        step_size = step_size
-        max_dispersion_points = []  # Список для хранения точек с максимальной дисперсией
-        brightness_list = []
-        dispersion_list = []
-
-        # F5
-        brightness_list_5x5 = []
-        dispersion_list_5x5 = []
-
-        # Определяем размеры изображения
-        width = 178
-        height = 238
-        border = border_width
-        # Проходим по каждой вертикальной полосе изображения
-        for y in tqdm(range(border, height - border, step_size), desc="Processing rows from left to right"):
-            max_dispersion = 0  # Максимальная дисперсия в текущей полосе
-            max_dispersion_point = None  # Точка с максимальной дисперсией в текущей полосе
-
-            # Начинаем с верхней части изображения и двигаемся вниз с шагом step_size
-            for x in range(border, width):
-                # Проверяем, находятся ли координаты в пределах изображения
-                if 0 <= x < width and 0 <= y < height:
-                    # Получаем яркость окружающих пикселей для текущей точки
-                    surrounding_brightness = self.get_surrounding_pixel_brightness(x, y, self.image_name)
-                    # Вычисляем дисперсию яркостей окружающих пикселей
-                    dispersion = self.dispersion_by_brightness_list(surrounding_brightness)
-                    # print(f"[ {x};{y} ] {dispersion}")
-                    # Если текущая дисперсия больше дисперсии фона, начинаем отслеживать максимум
-                    if dispersion > dispersion_background:
-                        if dispersion > max_dispersion:
-                            max_dispersion = dispersion
-                            max_dispersion_point = (x, y)
-
-                        # Пропускаем остальные точки данного уровня
-                        break
-
-            # Если найден максимум на текущем уровне, добавляем его в список
-            if max_dispersion_point is not None:
-                pointX = max_dispersion_point[0]
-                pointY = max_dispersion_point[1]
-                # Для возможности сместить точку влево, вправо или вниз
-                next_point = (pointX, pointY)
-                max_dispersion_points.append(next_point)
-
-                brightness_list.append(self.analyze_pixel_and_surroundings(pointX, pointY, self.image_name))
-                brightness_list_5x5.append(self.analyze_pixel_and_surroundings_25(pointX, pointY, self.image_name))
-                # Получаем яркость окружающих пикселей для измененной текущей точки
-                surrounding_brightness = self.get_surrounding_pixel_brightness(pointX, pointY, self.image_name)
-                surrounding_brightness_5x5 = self.get_surrounding_pixel_brightness_25(pointX, pointY, self.image_name)
-                # Вычисляем дисперсию яркостей окружающих пикселей
-                dispersion = self.dispersion_by_brightness_list(surrounding_brightness)
-                dispersion_list.append(dispersion)
-                dispersion_5x5 = self.dispersion_by_brightness_list(surrounding_brightness_5x5)
-                dispersion_list_5x5.append(dispersion_5x5)
+        # Добавляем точки слева направо
+        max_dispersion_points, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5 = \
+            self.track_max_dispersion_points_From_Left_To_Right(dispersion_background, step_size, border_width)
 
         ###################################################################################
         first_point_x_left = max_dispersion_points[0][0]  # x-координата первой точки
@@ -370,6 +651,29 @@ class PixelBrightnessAnalyzer(workWithFiles):
         clear_console()
         return max_dispersion_points, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5
 
+    def track_max_dispersion_points_From_Left_To_Right(self, dispersion_background, step_size=6, border_width=40):
+        """
+        Отслеживает максимальные точки дисперсии на изображении, двигаясь слева направо.
+
+        Аргументы:
+        - dispersion_background (float): Значение дисперсии фона.
+        - step_size (int): Размер шага при перемещении по вертикали.
+        - border_width (int): Ширина области у края, которая не исследуется.
+
+        Возвращает:
+        - max_dispersion_points, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5
+          в том же формате, что и track_max_dispersion_points_From_Right_To_Left.
+        """
+        # Определяем размеры изображения
+        image_height, image_width = self.pixels.shape[:2]
+        width = image_width // 2 - 2
+        height = image_height - 2
+        border = border_width
+        # Для каждой строки берем первую слева точку, где дисперсия превышает дисперсию фона
+        rows = range(border, height - border, step_size)
+        max_dispersion_points = self.find_first_crossings_in_rows(dispersion_background, rows, range(border, width))
+        return self.fill_lists(max_dispersion_points)
+
     def track_max_dispersion_points_From_Right_To_Left(self, dispersion_background, step_size=6):
         """
         Отслеживает максимальные точки дисперсии на изображении, двигаясь справа налево.
@@ -385,57 +689,18 @@ class PixelBrightnessAnalyzer(workWithFiles):
         - brightness_list_5x5 (list): Список яркостей пикселей (для 5x5 окрестности) для каждой найденной точки.
         - dispersion_list_5x5 (list): Список дисперсий (для 5x5 окрестности) для каждой найденной точки.
         """
-        max_dispersion_points = []
-        brightness_list = []
-        dispersion_list = []
-        brightness_list_5x5 = []
-        dispersion_list_5x5 = []
         # Определяем размеры изображения
-        width = 178
-        height = 238
+        image_height, image_width = self.pixels.shape[:2]
+        height = image_height - 2
         border = 40
-        # Проходим по каждой вертикальной полосе изображения
-        for y in tqdm(range(border, height - border, step_size), desc="Processing rows from right to left"):
-            max_dispersion = 0  # Максимальная дисперсия в текущей полосе
-            max_dispersion_point = None  # Точка с максимальной дисперсией в текущей полосе
-
-            # Начинаем с верхней части изображения и двигаемся вниз с шагом step_size
-            for x in range(359 - border, 180, -1):
-                # Проверяем, находятся ли координаты в пределах изображения
-                if 180 <= x < 358 and 0 <= y < height:
-                    # Получаем яркость окружающих пикселей для текущей точки
-                    surrounding_brightness = self.get_surrounding_pixel_brightness(x, y, self.image_name)
-
-                    # Вычисляем дисперсию яркостей окружающих пикселей
-                    dispersion = self.dispersion_by_brightness_list(surrounding_brightness)
-                    # print(f"[ {x};{y} ] {dispersion}")
-                    # Если текущая дисперсия больше дисперсии фона, начинаем отслеживать максимум
-                    if dispersion > dispersion_background:
-                        if dispersion > max_dispersion:
-                            max_dispersion = dispersion
-                            max_dispersion_point = (x, y)
-
-                        # Пропускаем остальные точки данного уровня
-                        break
-
-            # Если найден максимум на текущем уровне, добавляем его в список
-            if max_dispersion_point is not None:
-                pointX = max_dispersion_point[0]
-                pointY = max_dispersion_point[1]
-                # Для возможности сместить точку влево, вправо или вниз
-                next_point = (pointX, pointY)
-                max_dispersion_points.append(next_point)
-
-                brightness_list.append(self.analyze_pixel_and_surroundings(pointX, pointY, self.image_name))
-                brightness_list_5x5.append(self.analyze_pixel_and_surroundings_25(pointX, pointY, self.image_name))
-                # Получаем яркость окружающих пикселей для измененной текущей точки
-                surrounding_brightness = self.get_surrounding_pixel_brightness(pointX, pointY, self.image_name)
-                surrounding_brightness_5x5 = self.get_surrounding_pixel_brightness_25(pointX, pointY, self.image_name)
-                # Вычисляем дисперсию яркостей окружающих пикселей
-                dispersion = self.dispersion_by_brightness_list(surrounding_brightness)
-                dispersion_list.append(dispersion)
-                dispersion_5x5 = self.dispersion_by_brightness_list(surrounding_brightness_5x5)
-                dispersion_list_5x5.append(dispersion_5x5)
+        # Правая половина изображения, без двух крайних столбцов
+        center = image_width // 2
+        columns = [x for x in range(image_width - 1 - border, center, -1) if center <= x < image_width - 2]
+        # Для каждой строки берем первую справа точку, где дисперсия превышает дисперсию фона
+        rows = range(border, height - border, step_size)
+        max_dispersion_points = self.find_first_crossings_in_rows(dispersion_background, rows, columns)
+        max_dispersion_points, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5 = \
+            self.fill_lists(max_dispersion_points)
 
         return max_dispersion_points, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5
 
@@ -460,89 +725,263 @@ class PixelBrightnessAnalyzer(workWithFiles):
         - dispersion_list_5x5 (list): Список дисперсий (для 5x5 окрестности) для каждой найденной точки.
         """
 
-        ###############################
-        max_dispersion_points = []
-        brightness_list = []
-        dispersion_list = []
-        brightness_list_5x5 = []
-        dispersion_list_5x5 = []
-        ###############################
+        # Вертикальные полосы сверху вниз и снизу вверх
+        top_side = self.track_max_dispersion_points_From_Top_To_Bottom(dispersion_background, step_size, top_border,
+                                                                       top_start, first_point_y_left)
+        bottom_side = self.track_max_dispersion_points_From_Bottom_To_Top(dispersion_background, step_size,
+                                                                          bottom_border, bottom_start, last_point_y_left)
+        return tuple(top_list + bottom_list for top_list, bottom_list in zip(top_side, bottom_side))
+
+    def track_max_dispersion_points_From_Top_To_Bottom(self, dispersion_background, step_size, top_border, top_start,
+                                                       first_point_y_left):
+        """
+        Отслеживает максимальные точки дисперсии в вертикальной полосе над объектом, двигаясь сверху вниз.
+
+        Аргументы:
+        - dispersion_background (float): Значение дисперсии фона.
+        - step_size (int): Шаг между столбцами.
+        - top_border (int): Ширина полосы.
+        - top_start (int): x-координата первого столбца полосы.
+        - first_point_y_left (int): Строка, до которой (включительно) просматриваются столбцы.
+
+        Возвращает:
+        - max_dispersion_points, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5.
+        """
+        max_dispersion_points = self.find_first_non_maximum_crossings_in_columns(
+            dispersion_background, range(top_start, top_start + top_border + 1, step_size),
+            range(0, first_point_y_left + 1))
+        return self.fill_lists(max_dispersion_points)
+
+    def track_max_dispersion_points_From_Bottom_To_Top(self, dispersion_background, step_size, bottom_border,
+                                                       bottom_start, last_point_y_left):
+        """
+        Отслеживает максимальные точки дисперсии в вертикальной полосе под объектом, двигаясь снизу вверх.
 
+        Аргументы:
+        - dispersion_background (float): Значение дисперсии фона.
+        - step_size (int): Шаг между столбцами.
+        - bottom_border (int): Ширина полосы.
+        - bottom_start (int): x-координата первого столбца полосы.
+        - last_point_y_left (int): Строка, выше которой столбцы не просматриваются.
+
+        Возвращает:
+        - max_dispersion_points, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5.
+        """
+        height = self.pixels.shape[0] - 2
+        max_dispersion_points = self.find_first_non_maximum_crossings_in_columns(
+            dispersion_background, range(bottom_start, bottom_start + bottom_border + 1, step_size),
+            range(height, last_point_y_left + 1, -1))
+        return self.fill_lists(max_dispersion_points)
+
+    @timed("track")
+    def track_contour_points(self, dispersion_background, step_size=6, border_width=40, search_radius=8):
+        """
+        Отслеживает точки границы, следуя по контуру объекта.
+
+        Первая точка каждой стороны ищется проходом строки (столбца) от края до первого превышения фона,
+        а для следующих строк (столбцов) проверяется только окно вокруг точки, ожидаемой по двум предыдущим
+        (не шире +-4 * search_radius, см. follow_first_crossings). Если в окне границы нет, строка пропускается;
+        заново от края линия просматривается только после нескольких пропущенных подряд линий. Карта
+        дисперсии не строится: вычисляются только окрестности просмотренных точек (их число - в
+        self.evaluated_windows). Большую часть вычислений занимают линии, которые не пересекают объект:
+        чтобы убедиться, что границы на линии нет, ее нужно просмотреть целиком, как и в track_max_dispersion_points.
+
+        Правила выбора точек те же, что в track_max_dispersion_points: в строках - первое превышение фона,
+        в столбцах - первое превышение фона, не дающее нового максимума дисперсии. Отличие в том, что точки
+        строки (столбца) до окна поиска не проверяются: если ближе к краю, чем окно, есть другое превышение
+        фона (шум, блик) или граница сместилась дальше окна, найденная точка отличается от точки
+        track_max_dispersion_points или линия пропускается.
+
+        Аргументы:
+        - dispersion_background (float): Значение дисперсии фона.
+        - step_size (int): Шаг между исследуемыми строками и столбцами.
+        - border_width (int): Ширина области у края, которая не исследуется.
+        - search_radius (int): Полуширина окна поиска вокруг предыдущей точки.
+
+        Возвращает:
+        - max_dispersion_points, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5
+          в том же формате, что и track_max_dispersion_points.
+        """
         # Определяем размеры изображения
-        y_start = first_point_y_left
-        y_end = last_point_y_left
-        height = 238
-        # Проходим по каждой вертикальной полосе изображения сверху вниз
-        for x in range(top_start, top_start + top_border + 1, step_size):            # Проходим по каждой горизонтальной полосе изображения слева направо
-            max_dispersion = 0  # Максимальная дисперсия в текущей полосе
-            # print(f"Максимум дисперсии : {max_dispersion}")
-            max_dispersion_point = None  # Точка с максимальной дисперсией в текущей полосе
-            # print(f"Максимум дисперсии : {max_dispersion_point}")
-            for y in range(0, y_start + 1):
-                # Вычисляем дисперсию яркостей окружающих пикселей
-                dispersion = self.dispersion_by_brightness_list(self.get_surrounding_pixel_brightness(x, y, self.image_name))
-                if dispersion > dispersion_background:
-                    if dispersion > max_dispersion:
-                        max_dispersion = dispersion
-                        max_dispersion_point = (x, y)
-                    else:
-                        pointX = x
-                        pointY = y
-                        max_dispersion_point = (x, y)
-                        max_dispersion_points.append(max_dispersion_point)
-                        brightness_list.append(self.analyze_pixel_and_surroundings(pointX, pointY, self.image_name))
-                        brightness_list_5x5.append(self.analyze_pixel_and_surroundings_25(pointX, pointY, self.image_name))
-                        # Получаем яркость окружающих пикселей для измененной текущей точки
-                        surrounding_brightness = self.get_surrounding_pixel_brightness(pointX, pointY, self.image_name)
-                        surrounding_brightness_5x5 = self.get_surrounding_pixel_brightness_25(pointX, pointY,
-                                                                                              self.image_name)
-                        # Вычисляем дисперсию яркостей окружающих пикселей
-                        dispersion = self.dispersion_by_brightness_list(surrounding_brightness)
-                        dispersion_list.append(dispersion)
-                        dispersion_5x5 = self.dispersion_by_brightness_list(surrounding_brightness_5x5)
-                        dispersion_list_5x5.append(dispersion_5x5)
-                        break
-
-        # Проходим по каждой вертикальной полосе изображения снизу вверх
-        for x in range(bottom_start, bottom_start + bottom_border + 1, step_size):  # Проходим по каждой горизонтальной полосе изображения слева направо
-            max_dispersion = 0  # Максимальная дисперсия в текущей полосе
-            # print(f"Максимум дисперсии : {max_dispersion}")
-            max_dispersion_point = None  # Точка с максимальной дисперсией в текущей полосе
-            # print(f"Максимум дисперсии : {max_dispersion_point}")
-            for y in range(height, y_end + 1, -1):
-                # Вычисляем дисперсию яркостей окружающих пикселей
-                dispersion = self.dispersion_by_brightness_list(
-                    self.get_surrounding_pixel_brightness(x, y, self.image_name))
+        image_height, image_width = self.pixels.shape[:2]
+        width = image_width // 2 - 2
+        height = image_height - 2
+        center = image_width // 2
+        rows = range(border_width, height - border_width, step_size)
+
+        # Слева направо и справа налево
+        left_points = self.follow_first_crossings(dispersion_background, rows, range(border_width, width),
+                                                  True, search_radius)
+        right_columns = [x for x in range(image_width - 1 - border_width, center, -1) if center <= x < image_width - 2]
+        right_points = self.follow_first_crossings(dispersion_background, rows, right_columns, True, search_radius)
+        max_dispersion_points = left_points + right_points
+
+        # Сверху вниз и снизу вверх между крайними точками левой и правой сторон
+        if left_points and right_points:
+            top_columns = range(left_points[0][0], right_points[0][0] + 1, step_size)
+            max_dispersion_points += self.follow_first_crossings(
+                dispersion_background, top_columns, range(0, left_points[0][1] + 1), False, search_radius,
+                non_maximum=True)
+            bottom_columns = range(left_points[-1][0], right_points[-1][0] + 1, step_size)
+            max_dispersion_points += self.follow_first_crossings(
+                dispersion_background, bottom_columns, range(height, left_points[-1][1] + 1, -1), False,
+                search_radius, non_maximum=True)
+
+        max_dispersion_points, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5 = \
+            self.fill_lists(max_dispersion_points)
+        # записываем в выходной файл координаты точек
+        self.write_coordinates_to_file(max_dispersion_points)
+        clear_console()
+        return max_dispersion_points, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5
+
+    def follow_first_crossings(self, dispersion_background, lines, scan, along_rows, search_radius, max_radius=None,
+                               max_lost=2, non_maximum=False):
+        """
+        Для каждой линии (строки или столбца) находит точку входа в область, где дисперсия 3x3 больше
+        дисперсии фона, проверяя только окно вокруг ожидаемой точки.
+
+        Ожидаемая точка продолжает прямую через точки двух предыдущих линий. Окно +-search_radius
+        вокруг нее при необходимости расширяется вдвое до +-max_radius; среди входов в область (точка
+        превышает фон, предыдущая по обходу - нет) берется ближайший к ожидаемой точке. Если в окне
+        входа нет, линия пропускается. Линия просматривается от начала (до первого превышения фона,
+        без расчета остальной линии) только для первой точки и после max_lost пропущенных подряд линий.
+
+        Аргументы:
+        - dispersion_background (float): Значение дисперсии фона.
+        - lines (iterable): Координаты линий (y строк, если along_rows, иначе x столбцов).
+        - scan (iterable): Координаты вдоль линии в порядке обхода.
+        - along_rows (bool): True - линии являются строками, False - столбцами.
+        - search_radius (int): Начальная полуширина окна поиска.
+        - max_radius (int): Наибольшая полуширина окна поиска (по умолчанию 4 * search_radius).
+        - max_lost (int): Количество пропущенных подряд линий, после которого точка ищется заново от начала линии.
+        - non_maximum (bool): Вместо точки входа брать первую после нее точку, где превышение фона не дает
+          нового максимума дисперсии (правило вертикальных проходов track_max_dispersion_points, см. first_non_maximum).
+
+        Возвращает:
+        - points (list): Список найденных точек [(x1, y1), (x2, y2), ...].
+        """
+        scan = np.asarray(scan, dtype=np.intp)
+        if max_radius is None:
+            max_radius = 4 * search_radius
+        points = []
+        history = []  # индексы в scan точек последних найденных линий
+        lost = 0
+        for line in lines:
+            if lost > max_lost:
+                history = []
+            if history:
+                found = self.find_entry_near(dispersion_background, line, scan, along_rows, history,
+                                             search_radius, max_radius)
+            else:
+                found = self.find_first_crossing(dispersion_background, line, scan, along_rows)
+            if found is not None and non_maximum:
+                found = self.find_non_maximum_after(dispersion_background, line, scan, along_rows, found)
+            if found is None:
+                lost += 1
+                continue
+            lost = 0
+            history = history[-1:] + [found]
+            points.append((int(scan[found]), int(line)) if along_rows else (int(line), int(scan[found])))
+        return points
+
+    def find_entry_near(self, dispersion_background, line, scan, along_rows, history, search_radius, max_radius):
+        """
+        Ищет первый по обходу вход в область превышения фона в окне вокруг точки, ожидаемой по предыдущим линиям.
+
+        Окно расширяется вдвое от search_radius до max_radius; окрестности уже проверенных точек повторно
+        не вычисляются. Берется первая по обходу точка окна, где дисперсия превышает фон; если область
+        начинается раньше окна, ее начало находится проходом назад до точки без превышения фона.
+
+        Возвращает:
+        - index (int): Индекс точки в scan или None, если в окне +-max_radius превышения фона нет.
+        """
+        predicted = history[-1] if len(history) < 2 else 2 * history[-1] - history[-2]
+        predicted = min(max(predicted, 0), scan.size - 1)
+        crossings = np.zeros(scan.size, dtype=bool)
+        evaluated = np.zeros(scan.size, dtype=bool)
+        radius = search_radius
+        while True:
+            start = max(predicted - radius, 0)
+            stop = min(predicted + radius + 1, scan.size)
+            new = np.flatnonzero(~evaluated[start:stop]) + start
+            if new.size:
+                crossings[new] = self.scan_crossings(dispersion_background, line, scan[new], along_rows)
+                evaluated[new] = True
+            if crossings[start:stop].any():
+                break
+            if radius >= max_radius:
+                return None
+            radius = min(2 * radius, max_radius)
+        found = start + int(crossings[start:stop].argmax())
+        # Область продолжается до окна - идем назад до ее начала
+        while found == start and start > 0:
+            start = max(start - search_radius, 0)
+            backward = self.scan_crossings(dispersion_background, line, scan[start:found], along_rows)
+            outside = np.flatnonzero(~backward)
+            if outside.size:
+                return start + int(outside[-1]) + 1
+            found = start
+        return found
+
+    def find_first_crossing(self, dispersion_background, line, scan, along_rows, chunk_size=32):
+        """
+        Находит первую по обходу точку линии, где дисперсия 3x3 больше дисперсии фона.
+
+        Линия проверяется частями по chunk_size точек, после первого превышения фона проверка прекращается.
+
+        Возвращает:
+        - index (int): Индекс точки в scan или None, если превышения фона нет.
+        """
+        for start in range(0, scan.size, chunk_size):
+            crossings = self.scan_crossings(dispersion_background, line, scan[start:start + chunk_size], along_rows)
+            if crossings.any():
+                return start + int(crossings.argmax())
+        return None
+
+    def find_non_maximum_after(self, dispersion_background, line, scan, along_rows, entry, chunk_size=8):
+        """
+        Начиная с точки входа entry, находит первую точку, где дисперсия 3x3 больше дисперсии фона,
+        но не больше максимума дисперсии среди предыдущих таких точек (начальный максимум - 0).
+
+        Если entry - первое превышение фона на линии, результат совпадает с find_first_non_maximum_crossings_in_columns.
+        Линия проверяется частями по chunk_size точек до найденной точки.
+
+        Возвращает:
+        - index (int): Индекс точки в scan или None, если такой точки до конца линии нет.
+        """
+        previous_max = 0.0
+        for start in range(entry, scan.size, chunk_size):
+            dispersions = self.get_line_dispersions(line, scan[start:start + chunk_size], along_rows)
+            for offset, dispersion in enumerate(dispersions.tolist()):
                 if dispersion > dispersion_background:
-                    print(f"{x} {y}")
-                    print(f"Дисперсия : {dispersion}")
-                    if dispersion > max_dispersion:
-                        max_dispersion = dispersion
-                        max_dispersion_point = (x, y)
-                        print(f"Максимальная дисперсия {max_dispersion_point}")
-                    else:
-                        pointX = x
-                        pointY = y
-                        max_dispersion_point = (x, y)
-                        max_dispersion_points.append(max_dispersion_point)
-                        brightness_list.append(
-                            self.analyze_pixel_and_surroundings(pointX, pointY, self.image_name))
-                        brightness_list_5x5.append(
-                            self.analyze_pixel_and_surroundings_25(pointX, pointY, self.image_name))
-                        # Получаем яркость окружающих пикселей для измененной текущей точки
-                        surrounding_brightness = self.get_surrounding_pixel_brightness(pointX, pointY,
-                                                                                       self.image_name)
-                        surrounding_brightness_5x5 = self.get_surrounding_pixel_brightness_25(pointX, pointY,
-                                                                                              self.image_name)
-                        # Вычисляем дисперсию яркостей окружающих пикселей
-                        dispersion = self.dispersion_by_brightness_list(surrounding_brightness)
-                        dispersion_list.append(dispersion)
-                        dispersion_5x5 = self.dispersion_by_brightness_list(surrounding_brightness_5x5)
-                        dispersion_list_5x5.append(dispersion_5x5)
-                        break
+                    if dispersion <= previous_max:
+                        return start + offset
+                    previous_max = dispersion
+        return None
 
-        return max_dispersion_points, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5
+    def get_line_dispersions(self, line, scan, along_rows):
+        """
+        Вычисляет дисперсию 3x3 в точках линии.
+
+        Возвращает:
+        numpy.ndarray: Дисперсии длины len(scan).
+        """
+        lines = np.full(scan.size, line, dtype=np.intp)
+        points = np.column_stack((scan, lines) if along_rows else (lines, scan))
+        self.evaluated_windows += len(points)
+        return self.get_dispersions_batch(points)
+
+    def scan_crossings(self, dispersion_background, line, scan, along_rows):
+        """
+        Вычисляет маску точек линии, где дисперсия 3x3 больше дисперсии фона.
+
+        Возвращает:
+        numpy.ndarray: Маска длины len(scan).
+        """
+        dispersions = self.get_line_dispersions(line, scan, along_rows)
+        return (dispersions > dispersion_background) & (dispersions > 0)
 
+    @timed("random_points")
     def select_random_points_and_save(self, height, width):
         """
         Выбирает случайные точки из левой полоски изображения и записывает их в файл точек.
@@ -566,6 +1005,7 @@ class PixelBrightnessAnalyzer(workWithFiles):
             point_list.append((random_x[i], random_y[i]))
         self.write_coordinates_to_file(point_list)
 
+    @timed("fill_lists")
     def fill_lists(self, point_list):
         """
         Заполняет списки яркости и дисперсии для указанных точек и их 5x5 окрестностей.
@@ -581,29 +1021,126 @@ class PixelBrightnessAnalyzer(workWithFiles):
         - brightness_list_5x5 (list): Список значений яркости для каждой 5x5 окрестности.
         - dispersion_list_5x5 (list): Список значений дисперсии для каждой 5x5 окрестности.
         """
-        brightness_list = []
-        dispersion_list = []
-        brightness_list_5x5 = []
-        dispersion_list_5x5 = []
-
-        for point in point_list:
-            pointX, pointY = point
-            # Получаем яркость и дисперсию для текущей точки
-            brightness_list.append(self.analyze_pixel_and_surroundings(pointX, pointY, self.image_name))
-            brightness_list_5x5.append(self.analyze_pixel_and_surroundings_25(pointX, pointY, self.image_name))
-            # Получаем яркость окружающих пикселей для измененной текущей точки
-            surrounding_brightness = self.get_surrounding_pixel_brightness(pointX, pointY, self.image_name)
-            surrounding_brightness_5x5 = self.get_surrounding_pixel_brightness_25(pointX, pointY, self.image_name)
-            # Вычисляем дисперсию яркостей окружающих пикселей
-            dispersion = self.dispersion_by_brightness_list(surrounding_brightness)
-            dispersion_list.append(dispersion)
-            dispersion_5x5 = self.dispersion_by_brightness_list(surrounding_brightness_5x5)
-            dispersion_list_5x5.append(dispersion_5x5)
+        # Окрестности 3x3 и 5x5 всех точек считаются за одно чтение буфера
+        brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5 = \
+            [values.tolist() for values in self.analyze_points_batch(point_list)]
 
         return point_list, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5
 
+    def get_factors(self, points, window_size=3):
+        """
+        Вычисляет целые среднюю яркость M и дисперсию D окрестностей точек так же, как программы facts3/facts5.
+
+        Отличия от fill_lists повторяют эталонные программы: окно у края изображения обрезается,
+        деления выполняются в float32 с отбрасыванием дробной части, дисперсия считается как
+        (среднее квадратов - M * M) * n / (n - 1).
+
+        Аргументы:
+        - points (array-like): Массив координат точек размером N x 2 [(x1, y1), (x2, y2), ...].
+        - window_size (int): Размер окна (3 для facts3, 5 для facts5).
+
+        Возвращает:
+        - means, dispersions (numpy.ndarray): Целочисленные массивы длины N.
+        """
+        points = np.asarray(points, dtype=np.intp).reshape(-1, 2)
+        height, width = self.pixels.shape[:2]
+        xs, ys = points[:, 0], points[:, 1]
+        if ((xs < 0) | (xs >= width) | (ys < 0) | (ys >= height)).any():
+            raise IndexError(f"Точка вне изображения {self.image_name} размером {width}x{height}")
+        instrumentation.count("window_evaluations", len(points))
+        if self.tile_size is not None:
+            # В поплиточном режиме таблицы сумм для всего изображения не строятся
+            return factors_from_sums(*clipped_window_sums_direct(self.pixels, xs, ys, window_size))
+        return factors_from_sums(*self.integral_image.clipped_window_sums(xs, ys, window_size))
+
+    @timed("fill_factor_lists")
+    def fill_factor_lists(self, point_list):
+        """
+        Заполняет списки M и D окрестностей 3x3 и 5x5 точек в формате файлов factorsN.txt (см. get_factors).
+
+        Аргументы:
+        - point_list (list): Список координат точек [(x1, y1), (x2, y2), ...].
+
+        Возвращает:
+        - point_list, means_3x3, dispersions_3x3, means_5x5, dispersions_5x5 - как fill_lists, но целые числа.
+        """
+        means_3x3, dispersions_3x3 = self.get_factors(point_list, 3)
+        means_5x5, dispersions_5x5 = self.get_factors(point_list, 5)
+        return point_list, means_3x3, dispersions_3x3, means_5x5, dispersions_5x5
+
+def first_non_maximum(dispersions, crossings):
+    """
+    Отмечает точки, где превышение фона не дает нового максимума дисперсии.
+
+    Аргументы:
+    - dispersions (numpy.ndarray): Значения дисперсии, последняя ось - порядок обхода.
+    - crossings (numpy.ndarray): Маска точек, где дисперсия больше дисперсии фона.
+
+    Возвращает:
+    - selected (numpy.ndarray): Маска точек, где дисперсия не больше предыдущего максимума.
+    - previous_max (numpy.ndarray): Максимум дисперсии среди предыдущих превышений (не меньше 0).
+    """
+    values = np.where(crossings, dispersions, -np.inf)
+    previous_max = np.zeros(values.shape)
+    previous_max[..., 1:] = np.maximum.accumulate(values, axis=-1)[..., :-1]
+    previous_max = np.maximum(previous_max, 0)
+    selected = crossings & (dispersions <= previous_max)
+    return selected, previous_max
+
+
+def factors_from_sums(sums, square_sums, counts):
+    """
+    Переводит суммы по окнам в целые M и D так же, как программы facts3/facts5.
+
+    Деления выполняются в float32 с отбрасыванием дробной части: M = sums / n,
+    D = (square_sums / n - M * M) * (n / (n - 1)).
+
+    Аргументы:
+    - sums, square_sums (numpy.ndarray): Суммы яркостей и квадратов яркостей по окнам (целые числа).
+    - counts (numpy.ndarray или int): Количество пикселей в окнах.
+
+    Возвращает:
+    - means, dispersions (numpy.ndarray): Целочисленные массивы (int64).
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    counts32 = counts.astype(np.float32)
+    means = (np.asarray(sums).astype(np.float32) / counts32).astype(np.int64)
+    dispersions = (np.asarray(square_sums).astype(np.float32) / counts32).astype(np.int64) - means * means
+    dispersions = (dispersions.astype(np.float32) * (counts32 / (counts - 1).astype(np.float32))).astype(np.int64)
+    return means, dispersions
+
+
+def window_mean_and_dispersion(windows):
+    """
+    Вычисляет среднее и выборочную дисперсию для каждой строки массива окрестностей.
+
+    Суммирование квадратов отклонений идет по порядку элементов, как в dispersion_by_brightness_list,
+    поэтому результаты совпадают до бита.
+
+    Аргументы:
+    - windows (numpy.ndarray): Массив яркостей размером N x n (целые числа).
+
+    Возвращает:
+    - mean (numpy.ndarray): Средние значения (длина N).
+    - dispersion (numpy.ndarray): Дисперсии со знаменателем n - 1 (длина N).
+    """
+    instrumentation.count("window_evaluations", len(windows))
+    n = windows.shape[1]
+    mean = windows.sum(axis=1) / n
+    if n < 2:
+        return mean, np.zeros(len(windows))
+    squares_sum = np.zeros(len(windows))
+    for column in windows.T:
+        deviation = column - mean
+        squares_sum = squares_sum + deviation * deviation
+    return mean, squares_sum / (n - 1)
+
+
 def clear_console():
     """
     Очищает консольный вывод в зависимости от операционной системы.
+    Если вывод перенаправлен (запуск без терминала, например из планировщика), ничего не делает.
     """
+    if not sys.stdout.isatty():
+        return
     os.system('cls' if os.name == 'nt' else 'clear')
@@ -0,0 +1,197 @@
+import argparse
+import numpy as np
+import os
+import re
+
+# Одна запись - одна точка: координаты, номер изображения, признаки окрестностей 3x3 и 5x5 и метка
+# (1 - граница, 0 - фон). Координаты хранятся один раз, в отличие от outputF3.txt и outputF5.txt.
+FEATURE_DTYPE = np.dtype([
+    ("x", "<i4"),
+    ("y", "<i4"),
+    ("image", "<i4"),
+    ("mean3", "<f8"),
+    ("dispersion3", "<f8"),
+    ("mean5", "<f8"),
+    ("dispersion5", "<f8"),
+    ("label", "i1"),
+])
+
+
+def features_from_lists(tuple_data, image_id, label=1):
+    """
+    Собирает структурированный массив признаков из результата fill_lists.
+
+    Параметры:
+    - tuple_data (tuple): (points, mean3, dispersion3, mean5, dispersion5), как возвращает fill_lists.
+    - image_id (int): Номер изображения.
+    - label (int): Метка точек: 1 - граница, 0 - фон.
+
+    Возвращает:
+    - features (numpy.ndarray): Массив с типом FEATURE_DTYPE.
+    """
+    points, mean3, dispersion3, mean5, dispersion5 = tuple_data
+    features = np.zeros(len(points), dtype=FEATURE_DTYPE)
+    if len(points):
+        points = np.asarray(points).reshape(-1, 2)
+        features["x"] = points[:, 0]
+        features["y"] = points[:, 1]
+    features["image"] = image_id
+    features["mean3"] = mean3
+    features["dispersion3"] = dispersion3
+    features["mean5"] = mean5
+    features["dispersion5"] = dispersion5
+    features["label"] = label
+    return features
+
+
+def get_shard_path(shard_folder, image_id):
+    """
+    Возвращает путь к файлу признаков изображения с номером image_id.
+    """
+    return os.path.join(shard_folder, f"features{image_id}.npy")
+
+
+def write_shard(shard_folder, features, image_id):
+    """
+    Записывает признаки одного изображения в отдельный файл .npy.
+
+    Файл пишется во временный файл и затем переименовывается, поэтому читатель не видит недописанных данных.
+
+    Параметры:
+    - shard_folder (строка): Каталог файлов признаков.
+    - features (numpy.ndarray): Массив с типом FEATURE_DTYPE.
+    - image_id (int): Номер изображения.
+
+    Возвращает:
+    - path (строка): Путь к записанному файлу.
+    """
+    os.makedirs(shard_folder, exist_ok=True)
+    path = get_shard_path(shard_folder, image_id)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as file:
+        np.save(file, np.asarray(features, dtype=FEATURE_DTYPE))
+    os.replace(temp_path, path)
+    return path
+
+
+def get_shard_paths(shard_folder):
+    """
+    Возвращает пути к файлам признаков каталога в порядке номеров изображений.
+    """
+    shards = [file for file in os.listdir(shard_folder) if re.fullmatch(r"features\d+\.npy", file)]
+    shards.sort(key=lambda file: int(re.search(r"\d+", file).group()))
+    return [os.path.join(shard_folder, file) for file in shards]
+
+
+def read_shards(shard_folder, concatenate=False):
+    """
+    Читает признаки всех изображений каталога.
+
+    Файлы открываются через memmap и не копируются в память: по умолчанию возвращается список
+    массивов - по одному на изображение. Столбцы (shard["x"], shard["mean3"], ...) - массивы NumPy
+    без Python-объектов для каждой строки.
+
+    Параметры:
+    - shard_folder (строка): Каталог файлов признаков.
+    - concatenate (bool): Склеить файлы в один массив. Склеенный массив - копия всех файлов в памяти.
+
+    Возвращает:
+    - shards (list): Массивы numpy.memmap с типом FEATURE_DTYPE в порядке номеров изображений
+      (при concatenate=True - один массив numpy.ndarray).
+    """
+    shards = [np.load(path, mmap_mode="r") for path in get_shard_paths(shard_folder)]
+    if not concatenate:
+        return shards
+    if not shards:
+        return np.zeros(0, dtype=FEATURE_DTYPE)
+    return np.concatenate(shards)
+
+
+def read_columns(shard_folder):
+    """
+    Генератор: признаки изображений каталога по столбцам, по одному файлу признаков за раз.
+
+    Возвращает (по одному):
+    - columns (dict): {имя поля FEATURE_DTYPE: numpy.ndarray} - представления файла признаков (memmap),
+      без копирования. Общие столбцы всех изображений - read_shards(shard_folder, concatenate=True).
+    """
+    for shard in read_shards(shard_folder):
+        yield {name: shard[name] for name in FEATURE_DTYPE.names}
+
+
+def features_to_text(features, f3_file, f5_file, append=False):
+    """
+    Записывает признаки в текстовые файлы в формате outputF3.txt и outputF5.txt ("x y среднее дисперсия").
+
+    Числа форматируются так же, как в write_tuple_F3_data_to_file и write_tuple_F5_data_to_file,
+    поэтому файлы совпадают побайтно. Номер изображения и метка в текстовый формат не входят.
+
+    Параметры:
+    - features (numpy.ndarray): Массив с типом FEATURE_DTYPE.
+    - f3_file, f5_file (строки): Имена файлов F3 и F5.
+    - append (bool): Дописать в конец файлов вместо перезаписи.
+    """
+    mode = "a" if append else "w"
+    xs = features["x"].tolist()
+    ys = features["y"].tolist()
+    for filename, mean_name, dispersion_name in ((f3_file, "mean3", "dispersion3"), (f5_file, "mean5", "dispersion5")):
+        with open(filename, mode) as file:
+            file.writelines(f"{x} {y} {mean} {dispersion}\n" for x, y, mean, dispersion in
+                            zip(xs, ys, features[mean_name].tolist(), features[dispersion_name].tolist()))
+
+
+def features_from_text(f3_file, f5_file, image_id=-1, label=1):
+    """
+    Читает признаки из текстовых файлов F3 и F5.
+
+    Параметры:
+    - f3_file, f5_file (строки): Имена файлов F3 и F5 (строки в одном порядке).
+    - image_id (int): Номер изображения для всех точек (в текстовом формате его нет).
+    - label (int): Метка для всех точек.
+
+    Возвращает:
+    - features (numpy.ndarray): Массив с типом FEATURE_DTYPE.
+    """
+    data3 = np.loadtxt(f3_file, ndmin=2).reshape(-1, 4)
+    data5 = np.loadtxt(f5_file, ndmin=2).reshape(-1, 4)
+    if len(data3) != len(data5):
+        raise ValueError(f"В файлах {f3_file} и {f5_file} разное количество строк")
+    features = np.zeros(len(data3), dtype=FEATURE_DTYPE)
+    features["x"] = data3[:, 0]
+    features["y"] = data3[:, 1]
+    features["image"] = image_id
+    features["mean3"] = data3[:, 2]
+    features["dispersion3"] = data3[:, 3]
+    features["mean5"] = data5[:, 2]
+    features["dispersion5"] = data5[:, 3]
+    features["label"] = label
+    return features
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Преобразование файлов признаков .npy в outputF3/F5.txt и обратно")
+    commands = parser.add_subparsers(dest="command", required=True)
+    to_text = commands.add_parser("to-text", help="каталог файлов признаков -> outputF3.txt и outputF5.txt")
+    to_text.add_argument("shard_folder")
+    to_text.add_argument("--f3", default="outputF3.txt")
+    to_text.add_argument("--f5", default="outputF5.txt")
+    from_text = commands.add_parser("from-text", help="outputF3.txt и outputF5.txt -> файл признаков")
+    from_text.add_argument("shard_folder")
+    from_text.add_argument("--f3", default="outputF3.txt")
+    from_text.add_argument("--f5", default="outputF5.txt")
+    from_text.add_argument("--image-id", type=int, default=0, help="номер файла признаков featuresN.npy")
+    from_text.add_argument("--label", type=int, choices=[0, 1], default=1, help="1 - граница, 0 - фон")
+    args = parser.parse_args(argv)
+
+    if args.command == "to-text":
+        # Файлы признаков дописываются по одному, в памяти находится только текущий
+        features_to_text(np.zeros(0, dtype=FEATURE_DTYPE), args.f3, args.f5)
+        for shard in read_shards(args.shard_folder):
+            features_to_text(shard, args.f3, args.f5, append=True)
+    else:
+        features = features_from_text(args.f3, args.f5, args.image_id, args.label)
+        print(f"Записано точек: {len(features)} в {write_shard(args.shard_folder, features, args.image_id)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+from collections import OrderedDict
+from PIL import Image
+from bmpReader import read_grayscale_bmp
+from instrumentation import instrumentation
+import numpy as np
+import os
+import threading
+
+
+def get_default_max_entries(limit=256):
+    """
+    Возвращает количество изображений в кэше по умолчанию: не больше limit и не больше четверти
+    лимита открытых файлов процесса (каждый отображенный в память BMP держит дескриптор).
+    """
+    try:
+        import resource
+    except ImportError:
+        # Windows: модуля resource нет, лимит дескрипторов не ограничивает отображения так же
+        return limit
+    soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft_limit == resource.RLIM_INFINITY:
+        return limit
+    return max(1, min(limit, soft_limit // 4))
+
+
+class DecodedImageCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024, max_entries=None):
+        """
+        Инициализирует объект DecodedImageCache - общий для процесса кэш декодированных изображений.
+
+        Ключ записи - путь к файлу, время изменения и размер файла, поэтому измененный файл декодируется заново.
+        Черно-белые BMP отображаются в память read_grayscale_bmp (каждое отображение держит дескриптор файла,
+        поэтому max_entries ограничивает и число открытых дескрипторов), остальные изображения читаются
+        через PIL в буфер, не связанный с файлом. Когда объем декодированных данных превышает
+        max_bytes или изображений больше max_entries, вытесняются давно не использованные изображения.
+
+        Параметры:
+        - max_bytes (int): Максимальный объем декодированных данных в байтах.
+        - max_entries (int): Максимальное количество изображений в кэше (None - get_default_max_entries).
+        """
+        self.max_bytes = max_bytes
+        self.max_entries = get_default_max_entries() if max_entries is None else max_entries
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+
+    def get(self, path):
+        """
+        Возвращает декодированное изображение и его буфер яркостей.
+
+        Аргументы:
+        - path (строка): Путь к файлу изображения.
+
+        Возвращает:
+        - image (PIL.Image): Загруженное изображение (файл уже закрыт).
+        - pixels (numpy.ndarray): Буфер яркостей uint8 только для чтения, общий для всех пользователей кэша
+          (для BMP - представление отображенного файла, см. copy_pixels).
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                instrumentation.count("image_cache_hits")
+                return self.entries[key][:2]
+
+        instrumentation.count("image_opens")
+        with instrumentation.stage("decode", os.path.basename(path)):
+            # Черно-белые BMP отображаются в память без копирования, остальные форматы читаются через PIL
+            decoded = read_grayscale_bmp(path) if path.lower().endswith(".bmp") else None
+            if decoded is not None:
+                image, pixels = decoded
+            else:
+                # load() может отобразить файл в память (mmap держит дескриптор файла),
+                # поэтому в кэш кладется отдельная копия, а исходное изображение закрывается
+                with Image.open(path) as opened:
+                    opened.load()
+                    image = opened.copy()
+                pixels = np.array(image, dtype=np.uint8)
+                pixels.flags.writeable = False
+        # Отображенный BMP занимает только страницы файла, изображение PIL - буфер и данные
+        size = pixels.nbytes if decoded is not None else 2 * pixels.nbytes
+
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = (image, pixels, size)
+                self.total_bytes += size
+            self.entries.move_to_end(key)
+            result = self.entries[key][:2]
+            # Вытесняем давно не использованные изображения, последнее оставляем всегда
+            while (self.total_bytes > self.max_bytes or len(self.entries) > self.max_entries) and len(self.entries) > 1:
+                _, (_, _, evicted_size) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+        return result
+
+    def copy_pixels(self, image, pixels):
+        """
+        Копирует изображение из кэша в собственную память.
+
+        Копия не держит отображение файла и его дескриптор: ее используют те, кто хранит
+        много изображений одновременно дольше, чем они остаются в кэше.
+
+        Возвращает:
+        - image (PIL.Image): Изображение над скопированным буфером.
+        - pixels (numpy.ndarray): Скопированный буфер яркостей uint8 только для чтения.
+        """
+        pixels = np.array(pixels, dtype=np.uint8)
+        pixels.flags.writeable = False
+        return Image.frombuffer("L", (pixels.shape[1], pixels.shape[0]), pixels, "raw", "L", 0, 1), pixels
+
+    def clear(self):
+        """
+        Очищает кэш.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+
+# Общий кэш для всех анализаторов процесса
+decoded_image_cache = DecodedImageCache()
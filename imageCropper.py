@@ -1,4 +1,6 @@
 from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
+from imageCache import decoded_image_cache
 import os
 
 
@@ -14,11 +16,20 @@ class ImageCropper:
         self.input_folder = input_folder
         self.output_folder = output_folder
 
-    def crop_images(self):
+    def crop_images(self, workers=None, skip_up_to_date=True, reduce=1):
         """
         Обрезает изображения в папке ввода и сохраняет их в папку вывода.
 
         Извлекает изображения из папки ввода, обрезает каждое изображение до размера 360x240 пикселей и сохраняет в формате BMP в папку вывода.
+        Файлы обрабатываются параллельно в пуле потоков (декодирование JPEG в PIL отпускает GIL).
+
+        Параметры:
+        - workers (int): Количество потоков. По умолчанию (None) - как у ThreadPoolExecutor: min(32, число процессоров + 4).
+        - skip_up_to_date (bool): Пропускать изображения, которые уже обрезаны (см. is_up_to_date).
+        - reduce (int): Уменьшение при декодировании JPEG (1, 2, 4 или 8). При значении больше 1 JPEG декодируется
+          сразу в уменьшенном размере (Image.draft), и область 360x240 вырезается из уменьшенного изображения,
+          то есть охватывает в reduce раз большую часть кадра. Если уменьшенное изображение меньше области,
+          уменьшение не применяется. По умолчанию 1 - результат не меняется.
         """
         if not os.path.exists(self.input_folder):
             print(f"Папка {self.input_folder} не существует.")
@@ -26,56 +37,105 @@ class ImageCropper:
         if not os.path.exists(self.output_folder):
             os.makedirs(self.output_folder)
 
-        files = os.listdir(self.input_folder)
-        for file in files:
-            if file.endswith(".JPG"):
-                img_path = os.path.join(self.input_folder, file)
-                img = Image.open(img_path)
+        # Освобождаем отображенные в память изображения: файлы будут перезаписаны
+        decoded_image_cache.clear()
+        files = self.get_source_files()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for message in executor.map(lambda file: self.crop_file(file, skip_up_to_date, reduce), files):
+                print(message)
 
-                width, height = img.size
-                left = (width - 360) // 2
-                top = (height - 240) // 2
-                right = left + 360
-                bottom = top + 240
+    def get_source_files(self):
+        """
+        Получает исходные изображения папки ввода, по одному на каждый выходной BMP.
+
+        Файлы с одинаковым именем без расширения (Image1.JPG и Image1.bmp) пишут в один и тот же BMP,
+        поэтому из них обрабатывается только JPG: BMP с тем же именем - результат прошлой обрезки.
+
+        Возвращает:
+        - files (список строк): Имена файлов в алфавитном порядке.
+        """
+        sources = {}
+        for file in sorted(os.listdir(self.input_folder)):
+            stem, extension = os.path.splitext(file)
+            if extension not in (".JPG", ".jpg", ".bmp"):
+                continue
+            if stem not in sources or sources[stem].endswith(".bmp"):
+                sources[stem] = file
+        return sorted(sources.values())
+
+    def crop_file(self, file, skip_up_to_date=True, reduce=1):
+        """
+        Обрезает одно изображение из папки ввода и сохраняет его в формате BMP в папку вывода.
 
-                cropped_img = img.crop((left, top, right, bottom))
+        Параметры:
+        - file (строка): Имя файла в папке ввода.
+        - skip_up_to_date (bool): Не обрабатывать файл, если результат уже актуален.
+        - reduce (int): Уменьшение при декодировании JPEG (см. crop_images).
 
-                # Сохраняем изображение в формате BMP
-                output_path = os.path.join(self.output_folder, os.path.splitext(file)[0] + ".bmp")
-                cropped_img.save(output_path)
-                print(f"Изображение {file} успешно обрезано и сохранено в {self.output_folder}")
-            elif file.endswith(".jpg"):
-                img_path = os.path.join(self.input_folder, file)
-                img = Image.open(img_path)
+        Возвращает:
+        - message (строка): Сообщение о результате.
+        """
+        img_path = os.path.join(self.input_folder, file)
+        output_path = os.path.join(self.output_folder, os.path.splitext(file)[0] + ".bmp")
+        if skip_up_to_date and self.is_up_to_date(img_path, output_path):
+            return f"Изображение {file} уже обрезано, пропускаем"
 
+        with Image.open(img_path) as img:
+            if reduce > 1 and img.format == "JPEG":
                 width, height = img.size
-                left = (width - 360) // 2
-                top = (height - 240) // 2
-                right = left + 360
-                bottom = top + 240
+                # draft выбирает масштаб декодирования не меньше запрошенного размера
+                requested_size = (max(width // reduce, 360), max(height // reduce, 240))
+                img.draft(img.mode, requested_size)
+            cropped_img = self.crop_to_center(img)
+            # Читаем пиксели, пока файл открыт (исходный BMP может совпадать с выходным файлом)
+            cropped_img.load()
+
+        # Сохраняем изображение в формате BMP
+        cropped_img.save(output_path)
+        return f"Изображение {file} успешно обрезано и сохранено в {self.output_folder}"
+
+    def is_up_to_date(self, img_path, output_path, crop_width=360, crop_height=240):
+        """
+        Проверяет, что обрезанное изображение уже создано после последнего изменения исходного.
 
-                cropped_img = img.crop((left, top, right, bottom))
+        Если исходный и выходной файлы совпадают (BMP в той же папке), файл считается обрезанным,
+        когда его размер уже равен размеру области. Иначе сравнивается время изменения исходного
+        файла и BMP с тем же именем.
 
-                # Сохраняем изображение в формате BMP
-                output_path = os.path.join(self.output_folder, os.path.splitext(file)[0] + ".bmp")
-                cropped_img.save(output_path)
-                print(f"Изображение {file} успешно обрезано и сохранено в {self.output_folder}")
-            elif file.endswith(".bmp"):
-                img_path = os.path.join(self.input_folder, file)
-                img = Image.open(img_path)
+        Ограничение: проверка идет по именам файлов. После rename_output_images обрезанные изображения
+        называются ImageN.bmp, а JPG перенесены в deleted, поэтому сравнение по времени к ним уже не
+        применяется: повторная обрезка пропускает ImageN.bmp по размеру 360x240, а новые JPG
+        обрезаются всегда. Если вернуть JPG из deleted, он будет обрезан еще раз в новый BMP.
 
-                width, height = img.size
-                left = (width - 360) // 2
-                top = (height - 240) // 2
-                right = left + 360
-                bottom = top + 240
+        Возвращает:
+        - bool: True, если обрезку можно пропустить.
+        """
+        if not os.path.exists(output_path):
+            return False
+        if os.path.abspath(img_path) == os.path.abspath(output_path):
+            with Image.open(img_path) as img:
+                return img.size == (crop_width, crop_height)
+        return os.path.getmtime(output_path) >= os.path.getmtime(img_path)
+
+    def crop_to_center(self, img, crop_width=360, crop_height=240):
+        """
+        Вырезает из изображения центральную область заданного размера.
 
-                cropped_img = img.crop((left, top, right, bottom))
+        Параметры:
+        - img (PIL.Image): Исходное изображение.
+        - crop_width (int): Ширина области. По умолчанию 360.
+        - crop_height (int): Высота области. По умолчанию 240.
+
+        Возвращает:
+        - cropped_img (PIL.Image): Обрезанное изображение.
+        """
+        width, height = img.size
+        left = (width - crop_width) // 2
+        top = (height - crop_height) // 2
+        right = left + crop_width
+        bottom = top + crop_height
 
-                # Сохраняем изображение в формате BMP
-                output_path = os.path.join(self.output_folder, os.path.splitext(file)[0] + ".bmp")
-                cropped_img.save(output_path)
-                print(f"Изображение {file} успешно обрезано и сохранено в {self.output_folder}")
+        return img.crop((left, top, right, bottom))
 
     def rename_output_images(self, name_of_image_for_out):
         """
@@ -90,6 +150,8 @@ class ImageCropper:
             print(f"Папка {self.output_folder} не существует.")
             return
 
+        # Освобождаем отображенные в память изображения: файлы будут переименованы
+        decoded_image_cache.clear()
         files = os.listdir(self.output_folder)
         i = 1
         for file in files:
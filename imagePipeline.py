@@ -0,0 +1,171 @@
+from PIL import Image
+import os
+import imageCropper as ic
+import blackWhiteConverter as bwc
+import brightnessAnalyzer as ba
+from mapCache import WindowMapCache
+
+
+def get_source_filenames(input_folder, extensions=(".jpg", ".JPG", ".bmp")):
+    """
+    Получает отсортированный список исходных изображений (JPG/BMP) в каталоге.
+
+    Параметры:
+    - input_folder (строка): Путь к каталогу с исходными изображениями.
+    - extensions (кортеж строк): Допустимые расширения файлов.
+
+    Возвращает:
+    - filenames (список строк): Имена файлов в алфавитном порядке.
+    """
+    if not os.path.exists(input_folder):
+        print(f"Папка {input_folder} не существует.")
+        return []
+    return sorted(file for file in os.listdir(input_folder) if file.endswith(extensions))
+
+
+def stream_grayscale_crops(input_folder, save_folder=None, name_of_image_for_out="Image"):
+    """
+    Генератор: обрезает исходные изображения до 360x240 и переводит их в черно-белый формат в памяти.
+
+    Заменяет цепочку crop_images -> convert_to_black_and_white -> повторное чтение BMP анализатором.
+    Промежуточные BMP записываются, только если указан save_folder.
+
+    Параметры:
+    - input_folder (строка): Путь к каталогу с исходными изображениями.
+    - save_folder (строка): Каталог для сохранения обработанных BMP (None - не сохранять).
+    - name_of_image_for_out (строка): Префикс имен сохраняемых изображений (ImageN.bmp).
+
+    Возвращает (по одному):
+    - (image_name, bw_img): Имя изображения ImageN.bmp и черно-белое изображение PIL.
+    """
+    cropper = ic.ImageCropper(input_folder, save_folder)
+    converter = bwc.BlackAndWhiteConverter(input_folder, save_folder)
+    if save_folder is not None:
+        os.makedirs(save_folder, exist_ok=True)
+
+    for i, file in enumerate(get_source_filenames(input_folder), start=1):
+        image_name = f"{name_of_image_for_out}{i}.bmp"
+        yield image_name, crop_source_image(input_folder, file, image_name, save_folder, cropper, converter)
+
+
+def crop_source_image(input_folder, file, image_name, save_folder=None, cropper=None, converter=None):
+    """
+    Обрезает одно исходное изображение до 360x240 и переводит его в черно-белый формат в памяти.
+
+    Параметры:
+    - input_folder (строка): Путь к каталогу с исходными изображениями.
+    - file (строка): Имя исходного JPG/BMP файла.
+    - image_name (строка): Имя обработанного изображения (ImageN.bmp).
+    - save_folder (строка): Каталог для сохранения обработанного BMP (None - не сохранять).
+    - cropper, converter: Готовые ImageCropper и BlackAndWhiteConverter (None - создать).
+
+    Возвращает:
+    - bw_img (PIL.Image): Черно-белое изображение.
+    """
+    cropper = cropper or ic.ImageCropper(input_folder, save_folder)
+    converter = converter or bwc.BlackAndWhiteConverter(input_folder, save_folder)
+    with Image.open(os.path.join(input_folder, file)) as img:
+        bw_img = converter.convert_image(cropper.crop_to_center(img))
+    if save_folder is not None:
+        bw_img.save(os.path.join(save_folder, image_name))
+    return bw_img
+
+
+def create_stream_analyzer(input_folder, image_name, points_file, bw_img, output_folder="Output", options=None):
+    """
+    Создает PixelBrightnessAnalyzer для обработанного в памяти изображения.
+
+    Параметры:
+    - options (dict): Настройки быстрых путей: "cache_folder" (каталог кэша карт, None - без кэша),
+      "tile_size" и "tile_workers" (расчет карт по плиткам).
+    """
+    options = options or {}
+    cache_folder = options.get("cache_folder")
+    return ba.PixelBrightnessAnalyzer(input_folder, image_name, points_file, output_folder, image=bw_img,
+                                      map_cache=WindowMapCache(cache_folder) if cache_folder else None,
+                                      tile_size=options.get("tile_size"), tile_workers=options.get("tile_workers", 1))
+
+
+def track_points(analyzer, background_dispersion, step_size, border_width, tracker="max"):
+    """
+    Строит points файл границы выбранным способом: "max" - track_max_dispersion_points,
+    "contour" - track_contour_points.
+    """
+    if tracker == "contour":
+        return analyzer.track_contour_points(background_dispersion, step_size, border_width)
+    return analyzer.track_max_dispersion_points(background_dispersion, step_size, border_width)
+
+
+def stream_analyzers(input_folder, output_folder="Output", save_folder=None, options=None):
+    """
+    Генератор: создает PixelBrightnessAnalyzer для каждого обработанного в памяти изображения.
+
+    Параметры:
+    - input_folder (строка): Путь к каталогу с исходными изображениями.
+    - output_folder (строка): Путь к каталогу для pointsN.txt.
+    - save_folder (строка): Каталог для сохранения обработанных BMP (None - не сохранять).
+    - options (dict): Настройки быстрых путей (см. create_stream_analyzer).
+
+    Возвращает (по одному):
+    - analyzer (PixelBrightnessAnalyzer): Анализатор с points файлом pointsN.txt.
+    """
+    for i, (image_name, bw_img) in enumerate(stream_grayscale_crops(input_folder, save_folder), start=1):
+        yield create_stream_analyzer(save_folder or input_folder, image_name, f"points{i}.txt", bw_img,
+                                     output_folder, options)
+
+
+def analyze_stream(input_folder, background_dispersion, step_size=4, border_width=40, output_folder="Output",
+                   save_folder=None, options=None):
+    """
+    Генератор: обрезка -> черно-белый формат -> построение points файлов границы без промежуточных файлов.
+
+    Параметры:
+    - input_folder (строка): Путь к каталогу с исходными изображениями.
+    - background_dispersion (float): Максимальная дисперсия фона.
+    - step_size (int): Размер шага при перемещении по изображению.
+    - border_width (int): Ширина области, которая не будет исследована.
+    - output_folder (строка): Путь к каталогу для pointsN.txt.
+    - save_folder (строка): Каталог для сохранения обработанных BMP (None - не сохранять).
+    - options (dict): Настройки быстрых путей (см. create_stream_analyzer) и "tracker" ("max" или "contour").
+
+    Возвращает (по одному):
+    - tuple: Результат построения points файла для очередного изображения.
+    """
+    options = options or {}
+    for analyzer in stream_analyzers(input_folder, output_folder, save_folder, options):
+        yield track_points(analyzer, background_dispersion, step_size, border_width, options.get("tracker", "max"))
+
+
+def get_stream_tasks(input_folder, background_dispersion, step_size=4, border_width=40, output_folder="Output",
+                     save_folder=None, options=None, name_of_image_for_out="Image"):
+    """
+    Составляет задания analyze_source_image для всех исходных изображений каталога
+    (для параллельной обработки в пуле процессов).
+
+    Возвращает:
+    - tasks (list): Задания в порядке номеров изображений.
+    """
+    if save_folder is not None:
+        os.makedirs(save_folder, exist_ok=True)
+    return [(input_folder, file, f"{name_of_image_for_out}{i}.bmp", f"points{i}.txt", background_dispersion,
+             step_size, border_width, output_folder, save_folder, options or {})
+            for i, file in enumerate(get_source_filenames(input_folder), start=1)]
+
+
+def analyze_source_image(task):
+    """
+    Обрезает, переводит в черно-белый формат и анализирует одно исходное изображение (задание для пула процессов).
+
+    Параметры:
+    - task (tuple): (input_folder, file, image_name, points_file, background_dispersion, step_size, border_width,
+      output_folder, save_folder, options) - см. get_stream_tasks.
+
+    Возвращает:
+    - tuple: Результат построения points файла.
+    """
+    (input_folder, file, image_name, points_file, background_dispersion, step_size, border_width, output_folder,
+     save_folder, options) = task
+    bw_img = crop_source_image(input_folder, file, image_name, save_folder)
+    analyzer = create_stream_analyzer(save_folder or input_folder, image_name, points_file, bw_img, output_folder,
+                                      options)
+    return track_points(analyzer, background_dispersion, step_size, border_width, options.get("tracker", "max"))
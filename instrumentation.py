@@ -0,0 +1,168 @@
+from contextlib import contextmanager
+import functools
+import json
+import threading
+import time
+
+
+class Instrumentation:
+    def __init__(self):
+        """
+        Инициализирует объект Instrumentation - счетчики и замеры времени этапов обработки.
+
+        По умолчанию выключен: пока enabled равно False, методы count и stage ничего не делают.
+        Счетчики (например, чтения пикселей, открытия изображений, вычисленные окрестности, найденные точки)
+        суммируются по всему процессу. Время этапов накапливается по названию этапа и отдельно по изображениям;
+        этапы могут быть вложенными (например, track включает fill_lists), время каждого этапа - полное.
+        """
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Обнуляет счетчики и замеры времени.
+        """
+        with self.lock:
+            self.counters = {}
+            self.stages = {}  # {этап: [количество вызовов, секунды]}
+            self.images = {}  # {изображение: {этап: секунды}}
+
+    def enable(self, enabled=True):
+        """
+        Включает или выключает сбор данных.
+        """
+        self.enabled = enabled
+
+    def count(self, name, amount=1):
+        """
+        Увеличивает счетчик name на amount.
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @contextmanager
+    def stage(self, name, image=None):
+        """
+        Замеряет время выполнения блока with как этапа name.
+
+        Параметры:
+        - name (строка): Название этапа.
+        - image (строка): Имя обрабатываемого изображения (None - этап не относится к одному изображению).
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start, image)
+
+    def record(self, name, seconds, image=None, calls=1):
+        """
+        Добавляет время этапа.
+        """
+        with self.lock:
+            stage = self.stages.setdefault(name, [0, 0.0])
+            stage[0] += calls
+            stage[1] += seconds
+            if image is not None:
+                image_stages = self.images.setdefault(image, {})
+                image_stages[name] = image_stages.get(name, 0.0) + seconds
+
+    def snapshot(self):
+        """
+        Возвращает собранные данные в виде словаря, пригодного для JSON.
+
+        Возвращает:
+        dict: {"counters": {...}, "stages": {этап: {"calls", "seconds"}}, "images": {изображение: {этап: секунды}}}.
+        """
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "stages": {name: {"calls": calls, "seconds": seconds}
+                           for name, (calls, seconds) in self.stages.items()},
+                "images": {image: dict(stages) for image, stages in self.images.items()},
+            }
+
+    def merge(self, snapshot):
+        """
+        Добавляет данные, собранные в другом процессе (результат snapshot).
+        """
+        if not self.enabled:
+            return
+        for name, amount in snapshot["counters"].items():
+            self.count(name, amount)
+        for name, stage in snapshot["stages"].items():
+            self.record(name, stage["seconds"], calls=stage["calls"])
+        with self.lock:
+            for image, stages in snapshot["images"].items():
+                image_stages = self.images.setdefault(image, {})
+                for name, seconds in stages.items():
+                    image_stages[name] = image_stages.get(name, 0.0) + seconds
+
+    def dump(self, path):
+        """
+        Записывает собранные данные в файл JSON.
+        """
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file, ensure_ascii=False, indent=2)
+
+    def summary(self):
+        """
+        Возвращает текстовую сводку: счетчики, время этапов и самые долгие изображения.
+        """
+        snapshot = self.snapshot()
+        lines = ["Счетчики:"]
+        for name, amount in sorted(snapshot["counters"].items()):
+            lines.append(f"  {name}: {amount}")
+        lines.append("Этапы (вызовов, всего с):")
+        for name, stage in sorted(snapshot["stages"].items(), key=lambda item: -item[1]["seconds"]):
+            lines.append(f"  {name}: {stage['calls']}, {stage['seconds']:.3f}")
+        image_totals = sorted(((max(stages.values()), image) for image, stages in snapshot["images"].items()),
+                              reverse=True)
+        if image_totals:
+            lines.append("Самые долгие изображения (с):")
+            for seconds, image in image_totals[:10]:
+                lines.append(f"  {image}: {seconds:.3f}")
+        return "\n".join(lines)
+
+
+def timed(name):
+    """
+    Декоратор: замеряет время каждого вызова функции как этапа name.
+
+    Если первый аргумент - объект с атрибутом image_name (например, PixelBrightnessAnalyzer),
+    время учитывается и для этого изображения.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not instrumentation.enabled:
+                return function(*args, **kwargs)
+            image = getattr(args[0], "image_name", None) if args else None
+            with instrumentation.stage(name, image):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def run_instrumented(function, task):
+    """
+    Выполняет задание в дочернем процессе пула и возвращает результат вместе с собранными данными.
+
+    Возвращает:
+    - result: Результат function(task).
+    - snapshot (dict): Данные Instrumentation дочернего процесса для merge в родительском процессе.
+    """
+    instrumentation.reset()
+    instrumentation.enable()
+    result = function(task)
+    return result, instrumentation.snapshot()
+
+
+# Общий объект для всего процесса
+instrumentation = Instrumentation()
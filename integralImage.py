@@ -0,0 +1,250 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import tempfile
+
+
+class IntegralImage:
+    def __init__(self, pixels):
+        """
+        Инициализирует объект IntegralImage (таблицы накопленных сумм) над декодированным изображением.
+
+        Параметры:
+        - pixels (numpy.ndarray): Двумерный массив яркостей изображения (uint8).
+        """
+        self.pixels = np.asarray(pixels)
+        # Таблицы сумм яркостей и квадратов яркостей для каждого радиуса окрестности
+        self.tables = {}
+
+    def get_tables(self, radius):
+        """
+        Строит (или берет из кэша) таблицы накопленных сумм значений и квадратов значений.
+
+        Изображение дополняется на radius пикселей с каждой стороны с переносом через край,
+        так же как Image.getpixel обрабатывает отрицательные координаты.
+
+        Аргументы:
+        - radius (int): Радиус окрестности (1 для 3x3, 2 для 5x5).
+
+        Возвращает:
+        - sum_table (numpy.ndarray): Таблица накопленных сумм яркостей.
+        - square_sum_table (numpy.ndarray): Таблица накопленных сумм квадратов яркостей.
+        """
+        if radius not in self.tables:
+            self.tables[radius] = summed_area_tables(np.pad(self.pixels, radius, mode="wrap"))
+        return self.tables[radius]
+
+    def window_sums(self, window_size=3):
+        """
+        Вычисляет суммы яркостей и квадратов яркостей в окне window_size x window_size для каждого пикселя.
+
+        Аргументы:
+        - window_size (int): Нечетный размер окна (3 для F3, 5 для F5 и т.д.).
+
+        Возвращает:
+        - sums (numpy.ndarray): Массив сумм яркостей (int64) размером с изображение.
+        - square_sums (numpy.ndarray): Массив сумм квадратов яркостей (int64) размером с изображение.
+        """
+        if window_size < 1 or window_size % 2 == 0:
+            raise ValueError(f"Размер окна должен быть нечетным положительным числом, получено {window_size}")
+        height, width = self.pixels.shape[:2]
+        return window_sums_from_tables(self.get_tables(window_size // 2), window_size, height, width)
+
+    def window_maps(self, window_size=3):
+        """
+        Вычисляет карты средней яркости и дисперсии в окне window_size x window_size для всего изображения.
+
+        Дисперсия выборочная (знаменатель n - 1), как в dispersion_by_brightness_list.
+
+        Аргументы:
+        - window_size (int): Нечетный размер окна (3 для F3, 5 для F5 и т.д.).
+
+        Возвращает:
+        - mean_map (numpy.ndarray): Карта средней яркости (float64).
+        - dispersion_map (numpy.ndarray): Карта дисперсии (float64).
+        """
+        return window_maps_from_sums(*self.window_sums(window_size), window_size)
+
+    def clipped_window_sums(self, xs, ys, window_size=3):
+        """
+        Вычисляет суммы по окнам window_size x window_size с центрами в точках (xs, ys), обрезанным краем изображения.
+
+        В отличие от window_sums, окно у края не переносится через край, а уменьшается
+        (так считают программы facts3/facts5), поэтому вместе с суммами возвращается число пикселей окна.
+
+        Аргументы:
+        - xs, ys (numpy.ndarray): Координаты центров окон.
+        - window_size (int): Нечетный размер окна.
+
+        Возвращает:
+        - sums, square_sums (numpy.ndarray): Суммы яркостей и квадратов яркостей (int64).
+        - counts (numpy.ndarray): Количество пикселей в каждом окне.
+        """
+        height, width = self.pixels.shape[:2]
+        radius = window_size // 2
+        # Границы окон в координатах таблиц (таблицы на единицу больше изображения)
+        x0 = np.maximum(xs - radius, 0)
+        x1 = np.minimum(xs + radius, width - 1) + 1
+        y0 = np.maximum(ys - radius, 0)
+        y1 = np.minimum(ys + radius, height - 1) + 1
+        sums = [table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0] for table in self.get_tables(0)]
+        return sums[0], sums[1], (x1 - x0) * (y1 - y0)
+
+
+def clipped_window_sums_direct(pixels, xs, ys, window_size=3):
+    """
+    Вычисляет то же, что IntegralImage.clipped_window_sums, но прямо по пикселям окон, без таблиц сумм.
+
+    Память пропорциональна числу точек, а не размеру изображения, поэтому функция используется
+    в поплиточном режиме, где таблицы для всего изображения не строятся.
+
+    Аргументы:
+    - pixels (numpy.ndarray): Двумерный массив яркостей.
+    - xs, ys (numpy.ndarray): Координаты центров окон.
+    - window_size (int): Нечетный размер окна.
+
+    Возвращает:
+    - sums, square_sums (numpy.ndarray): Суммы яркостей и квадратов яркостей (int64).
+    - counts (numpy.ndarray): Количество пикселей в каждом окне.
+    """
+    height, width = pixels.shape[:2]
+    radius = window_size // 2
+    sums = np.zeros(len(xs), dtype=np.int64)
+    square_sums = np.zeros(len(xs), dtype=np.int64)
+    counts = np.zeros(len(xs), dtype=np.int64)
+    for dy in range(-radius, radius + 1):
+        for dx in range(-radius, radius + 1):
+            # Пиксели за краем изображения в окно не входят
+            inside = (xs + dx >= 0) & (xs + dx < width) & (ys + dy >= 0) & (ys + dy < height)
+            values = pixels[np.where(inside, ys + dy, 0), np.where(inside, xs + dx, 0)].astype(np.int64) * inside
+            sums += values
+            square_sums += values * values
+            counts += inside
+    return sums, square_sums, counts
+
+
+def create_temporary_maps(shape, count=2):
+    """
+    Создает массивы float64 заданного размера в безымянных временных файлах (numpy.memmap).
+
+    Страницы таких массивов вытесняются на диск, поэтому карты большого изображения не держатся
+    в памяти целиком; файлы удаляются, когда массивы больше не используются.
+
+    Возвращает:
+    - maps (tuple): count массивов numpy.memmap.
+    """
+    maps = []
+    for _ in range(count):
+        # Отображение остается действительным после закрытия файла
+        with tempfile.TemporaryFile() as file:
+            maps.append(np.memmap(file, dtype=np.float64, mode="w+", shape=shape))
+    return tuple(maps)
+
+
+def summed_area_tables(block):
+    """
+    Строит таблицы накопленных сумм значений и квадратов значений (с нулевой первой строкой и столбцом).
+
+    Аргументы:
+    - block (numpy.ndarray): Двумерный массив яркостей.
+
+    Возвращает:
+    - sum_table, square_sum_table (numpy.ndarray): Таблицы int64 размером (h + 1) x (w + 1).
+    """
+    block = block.astype(np.int64)
+    sum_table = np.zeros((block.shape[0] + 1, block.shape[1] + 1), dtype=np.int64)
+    square_sum_table = np.zeros_like(sum_table)
+    sum_table[1:, 1:] = block.cumsum(axis=0).cumsum(axis=1)
+    square_sum_table[1:, 1:] = (block * block).cumsum(axis=0).cumsum(axis=1)
+    return sum_table, square_sum_table
+
+
+def window_sums_from_tables(tables, window_size, height, width):
+    """
+    Вычисляет суммы по окнам window_size x window_size из таблиц накопленных сумм дополненного блока.
+
+    Аргументы:
+    - tables (tuple): Таблицы summed_area_tables блока, дополненного на window_size // 2 с каждой стороны.
+    - window_size (int): Нечетный размер окна.
+    - height, width (int): Размеры блока без дополнения.
+
+    Возвращает:
+    - sums, square_sums (numpy.ndarray): Суммы яркостей и квадратов яркостей размером height x width.
+    """
+    sums = []
+    for table in tables:
+        # Сумма по окну через четыре обращения к таблице
+        sums.append(table[window_size:window_size + height, window_size:window_size + width]
+                    - table[:height, window_size:window_size + width]
+                    - table[window_size:window_size + height, :width]
+                    + table[:height, :width])
+    return sums[0], sums[1]
+
+
+def window_maps_from_sums(sums, square_sums, window_size):
+    """
+    Переводит суммы по окнам в среднюю яркость и выборочную дисперсию (знаменатель n - 1).
+
+    Возвращает:
+    - mean_map, dispersion_map (numpy.ndarray): Карты float64.
+    """
+    n = window_size * window_size
+    mean_map = sums / n
+    if n < 2:
+        return mean_map, np.zeros(mean_map.shape)
+    # n * S2 - S1^2 считается точно в целых числах, деление - одно округление
+    dispersion_map = (n * square_sums - sums * sums) / (n * (n - 1))
+    return mean_map, dispersion_map
+
+
+def tiled_window_maps(pixels, window_size=3, tile_size=256, workers=1, out=None):
+    """
+    Вычисляет карты средней яркости и дисперсии по плиткам tile_size x tile_size с перекрытием (ореолом)
+    window_size // 2 пикселей, для изображений любого размера.
+
+    Рабочая память ограничена размером плитки: таблицы сумм строятся только для плитки с ореолом,
+    а итоговые карты пишутся в массивы numpy.memmap (переданные в out или во временных файлах),
+    поэтому и они не держатся в памяти целиком.
+    На краях изображения ореол берется с переносом через край, как в IntegralImage,
+    поэтому результат совпадает с IntegralImage.window_maps.
+
+    Аргументы:
+    - pixels (numpy.ndarray): Двумерный массив яркостей.
+    - window_size (int): Нечетный размер окна (3 для F3, 5 для F5).
+    - tile_size (int): Сторона плитки в пикселях.
+    - workers (int): Количество потоков для параллельной обработки плиток.
+    - out (tuple): Массивы (mean_map, dispersion_map) для записи результата. None - создать во временных файлах.
+
+    Возвращает:
+    - mean_map, dispersion_map (numpy.ndarray): Карты размером с изображение.
+    """
+    if window_size < 1 or window_size % 2 == 0:
+        raise ValueError(f"Размер окна должен быть нечетным положительным числом, получено {window_size}")
+    pixels = np.asarray(pixels)
+    height, width = pixels.shape[:2]
+    radius = window_size // 2
+    if out is None:
+        out = create_temporary_maps((height, width))
+    mean_map, dispersion_map = out
+
+    def process_tile(origin):
+        top, left = origin
+        bottom = min(top + tile_size, height)
+        right = min(left + tile_size, width)
+        # Плитка с ореолом; за краем изображения индексы переносятся
+        rows = np.arange(top - radius, bottom + radius) % height
+        columns = np.arange(left - radius, right + radius) % width
+        block = pixels[np.ix_(rows, columns)]
+        sums = window_sums_from_tables(summed_area_tables(block), window_size, bottom - top, right - left)
+        mean_tile, dispersion_tile = window_maps_from_sums(*sums, window_size)
+        mean_map[top:bottom, left:right] = mean_tile
+        dispersion_map[top:bottom, left:right] = dispersion_tile
+
+    origins = [(top, left) for top in range(0, height, tile_size) for left in range(0, width, tile_size)]
+    if workers <= 1:
+        for origin in origins:
+            process_tile(origin)
+    else:
+        # Плитки не пересекаются по выходу, numpy освобождает GIL на вычислениях
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(process_tile, origins))
+    return mean_map, dispersion_map
@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Вычисляет SHA-256 содержимого файла.
+
+    Параметры:
+    - path (строка): Путь к файлу.
+    - chunk_size (int): Размер блока чтения в байтах.
+
+    Возвращает:
+    - hash (строка): Шестнадцатеричная строка хэша.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class JobManifest:
+    def __init__(self, output_folder="Output", file_name="manifest.jsonl"):
+        """
+        Инициализирует объект JobManifest - журнал выполненных заданий пакетной обработки.
+
+        Журнал хранится в output_folder в формате JSON Lines: каждая выполненная обработка изображения
+        дописывается отдельной строкой, поэтому прерванный запуск не теряет уже записанные результаты.
+        Пути изображений и выходных файлов записываются относительно output_folder, поэтому ответ
+        не зависит от текущего каталога, из которого запущена программа.
+
+        Параметры:
+        - output_folder (строка): Путь к каталогу с выходными файлами.
+        - file_name (строка): Имя файла журнала.
+        """
+        self.output_folder = output_folder
+        self.path = os.path.join(output_folder, file_name)
+        self.entries = {}
+        self.load()
+
+    def get_record_path(self, path):
+        """
+        Переводит путь в вид, в котором он хранится в журнале: относительно каталога журнала.
+
+        Возвращает:
+        - path (строка): Относительный путь (абсолютный, если файл на другом диске Windows).
+        """
+        try:
+            return os.path.relpath(os.path.abspath(path), os.path.abspath(self.output_folder))
+        except ValueError:
+            return os.path.abspath(path)
+
+    def get_real_path(self, record_path):
+        """
+        Переводит путь из журнала в путь для открытия файла.
+        """
+        return os.path.join(self.output_folder, record_path)
+
+    def load(self):
+        """
+        Загружает журнал. Для каждого задания и изображения действует последняя запись.
+        """
+        self.entries = {}
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Строка, недописанная при аварийном завершении
+                    continue
+                self.entries[(entry["job"], entry["image"])] = entry
+
+    def is_done(self, job, image_path, params, artifacts=None):
+        """
+        Проверяет, что изображение уже обработано заданием job с теми же параметрами.
+
+        Задание считается выполненным, если не изменились содержимое изображения, параметры
+        и все выходные файлы (они существуют и их хэши совпадают с записанными). Если переданы
+        ожидаемые выходные файлы, записанные файлы должны быть именно ими: после добавления, удаления
+        или перенумерации изображений файл pointsN.txt может принадлежать другому изображению.
+
+        Параметры:
+        - job (строка): Название задания (например, "boundary" или "background").
+        - image_path (строка): Путь к изображению.
+        - params (dict): Параметры обработки.
+        - artifacts (list): Ожидаемые пути выходных файлов (None - не проверять).
+
+        Возвращает:
+        - bool: True, если обработку можно пропустить.
+        """
+        entry = self.entries.get((job, self.get_record_path(image_path)))
+        if entry is None or entry["params"] != json.loads(json.dumps(params)):
+            return False
+        if artifacts is not None and set(entry["artifacts"]) != {self.get_record_path(path) for path in artifacts}:
+            return False
+        if not os.path.exists(image_path) or entry["hash"] != file_hash(image_path):
+            return False
+        for record_path, artifact_hash in entry["artifacts"].items():
+            artifact_path = self.get_real_path(record_path)
+            if not os.path.exists(artifact_path) or file_hash(artifact_path) != artifact_hash:
+                return False
+        return True
+
+    def mark_done(self, job, image_path, params, artifacts):
+        """
+        Записывает в журнал выполненную обработку изображения.
+
+        Параметры:
+        - job (строка): Название задания.
+        - image_path (строка): Путь к изображению.
+        - params (dict): Параметры обработки.
+        - artifacts (list): Пути к созданным выходным файлам.
+        """
+        entry = {
+            "job": job,
+            "image": self.get_record_path(image_path),
+            "hash": file_hash(image_path),
+            "params": json.loads(json.dumps(params)),
+            "artifacts": {self.get_record_path(artifact_path): file_hash(artifact_path) for artifact_path in artifacts},
+        }
+        os.makedirs(self.output_folder, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+        self.entries[(job, entry["image"])] = entry
@@ -1,14 +1,35 @@
 import imageCropper as ic
 import blackWhiteConverter as bwc
+import featureShards as fs
 import brightnessAnalyzer as ba
+import imagePipeline as ip
+import pointsFile as pf
+import argparse
+import atexit
 import os
+import random
 import re
+import shutil
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 # import exelTable as ex
 from PIL import Image
 from ExcelHandler import ExcelHandler
+from instrumentation import instrumentation, run_instrumented, timed
+from jobManifest import JobManifest
+from mapCache import WindowMapCache
 from tqdm import tqdm
 
 
+# Каталог дискового кэша карт дисперсии (None - без кэша)
+MAP_CACHE_FOLDER = "Cache"
+# Шаблон таблицы, из которого берется заголовок при потоковом экспорте
+EXCEL_TEMPLATE = "CopyOfWorkTable_пустая_таблица.xlsx"
+# Переменная окружения для сбора счетчиков и времени этапов: "1" - вывести сводку в конце, путь к .json - записать в файл
+INSTRUMENTATION_VARIABLE = "ANALYZER_STATS"
+
+
 def get_bmp_filenames(input_folder):
     """
     Получает список имен всех файлов с расширением ".bmp" из каталога Input.
@@ -35,95 +56,283 @@ def extract_number(filename):
     return int(filename.split('Image')[1].split('.')[0])
 
 
-def get_start_index():
+def imap_images(function, tasks, workers=1, desc="Progress of Analise of Image"):
+    """
+    Применяет функцию к списку заданий, последовательно или в пуле процессов, выдавая результаты по мере готовности.
+
+    Параметры:
+    - function: Функция уровня модуля, принимающая одно задание (должна быть доступна дочерним процессам).
+    - tasks (list): Список заданий.
+    - workers (int): Количество процессов. При значении 1 задания выполняются в текущем процессе.
+    - desc (строка): Подпись индикатора прогресса.
+
+    Возвращает (по одному):
+    - result: Результаты в том же порядке, что и задания.
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tqdm(tasks, desc=desc):
+            yield function(task)
+        return
+    # random.seed() в каждом процессе, чтобы случайные точки фона не повторялись между процессами
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=random.seed) as executor:
+        if not instrumentation.enabled:
+            yield from tqdm(executor.map(function, tasks), total=len(tasks), desc=desc)
+            return
+        # Счетчики дочерних процессов возвращаются вместе с результатом и добавляются к счетчикам этого процесса
+        for result, snapshot in tqdm(executor.map(partial(run_instrumented, function), tasks),
+                                     total=len(tasks), desc=desc):
+            instrumentation.merge(snapshot)
+            yield result
+
+
+def map_images(function, tasks, workers=1, desc="Progress of Analise of Image"):
+    """
+    Применяет функцию к списку заданий, последовательно или в пуле процессов.
+
+    Возвращает:
+    - results (list): Результаты в том же порядке, что и задания.
+    """
+    return list(imap_images(function, tasks, workers, desc))
+
+
+def get_workers_count(workers=None):
+    """
+    Запрашивает количество параллельных процессов, если оно не передано.
+
+    Возвращает:
+    int: Количество процессов (по умолчанию 1).
+    """
+    if workers is None:
+        workers_input = input(f"Введите количество параллельных процессов (1-{os.cpu_count()})\n     ")
+        workers = int(workers_input) if workers_input else 1
+    return max(1, workers)
+
+
+def track_image_points(task):
     """
-    Определяет стартовый индекс для создания объектов PixelBrightnessAnalyzer.
+    Строит points файл границы для одного изображения (задание для пула процессов).
 
-    Если в папке Output есть несколько файлов pointsN.txt, выбирается порядковый номер предпоследнего файла.
-    Если файлов pointsN.txt нет или их только один, стартовый индекс устанавливается на 1.
+    Параметры:
+    - task (tuple): (input_folder, bmp_filename, points_file, background_dispersion, step_size, border_width, options).
+      options (dict) - настройки быстрых путей:
+      "output_folder" (по умолчанию "Output"), "tracker" ("max" - track_max_dispersion_points,
+      "contour" - track_contour_points), "cache_folder" (каталог кэша карт, None - без кэша),
+      "tile_size" и "tile_workers" (расчет карт по плиткам).
+
+    Возвращает:
+    - tuple: Результат track_max_dispersion_points (или track_contour_points).
+    """
+    input_folder, bmp_filename, points_file, background_dispersion, step_size, border_width, options = task
+    cache_folder = options.get("cache_folder", MAP_CACHE_FOLDER)
+    map_cache = WindowMapCache(cache_folder) if cache_folder else None
+    analyzer = ba.PixelBrightnessAnalyzer(input_folder, bmp_filename, points_file, options.get("output_folder", "Output"),
+                                          map_cache=map_cache, tile_size=options.get("tile_size"),
+                                          tile_workers=options.get("tile_workers", 1))
+    print(f"Создан объект PixelBrightnessAnalyzer для {bmp_filename}")
+    if options.get("tracker", "max") == "contour":
+        return analyzer.track_contour_points(background_dispersion, step_size, border_width)
+    return analyzer.track_max_dispersion_points(background_dispersion, step_size, border_width)
+
+
+def save_image_random_points(task):
+    """
+    Строит points файл фона со случайными точками для одного изображения (задание для пула процессов).
+
+    Параметры:
+    - task (tuple): (input_folder, bmp_filename, points_file, height, width, output_folder).
+    """
+    input_folder, bmp_filename, points_file, height, width, output_folder = task
+    analyzer = ba.PixelBrightnessAnalyzer(input_folder, bmp_filename, points_file, output_folder)
+    print(f"Создан объект PixelBrightnessAnalyzer для {bmp_filename}")
+    analyzer.select_random_points_and_save(height, width)
+
+
+def estimate_image_background(task):
+    """
+    Оценивает дисперсию фона одного изображения (задание для пула процессов).
+
+    Параметры:
+    - task (tuple): (input_folder, bmp_filename, border_width, sample_size, min_coverage, exact).
 
     Возвращает:
-    int: Стартовый индекс.
-    """
-    existing_points_files = [f for f in os.listdir('Output') if f.startswith('points') and f.endswith('.txt')]
-    if len(existing_points_files) > 1:
-        existing_points_files.sort(key=lambda x: int(x[6:-4]))
-        start_index = int(existing_points_files[-2][6:-4])
-    elif len(existing_points_files) == 1:
-        start_index = 1
+    - dict: Результат estimate_background_dispersion.
+    """
+    input_folder, bmp_filename, border_width, sample_size, min_coverage, exact = task
+    analyzer = ba.PixelBrightnessAnalyzer(input_folder, bmp_filename)
+    return analyzer.estimate_background_dispersion(border_width, sample_size, min_coverage=min_coverage, exact=exact)
+
+
+@timed("background_batch")
+def estimate_folder_background_dispersion(input_folder, border_width=80, sample_size=2000, min_coverage=None,
+                                          workers=1, exact=False):
+    """
+    Оценивает дисперсию фона сразу для всех файлов BMP в каталоге.
+
+    Порог для всего каталога - наибольшая из оценок максимальной дисперсии фона отдельных изображений.
+    Максимум выборки - оценка снизу: он покрывает квантиль уровня coverage, а не всю область, поэтому
+    для точного значения нужен exact=True (или min_coverage выше достижимого для sample_size покрытия).
+
+    Параметры:
+    - input_folder (строка): Путь к каталогу с входными изображениями.
+    - border_width (int): Ширина исследуемой сверху области.
+    - sample_size (int): Количество точек выборки на изображение.
+    - min_coverage (float): Минимальное покрытие, ниже которого выполняется точный проход (None - не проверять).
+    - workers (int): Количество параллельных процессов.
+    - exact (bool): Вычислить точный максимум по всей области каждого изображения.
+
+    Возвращает:
+    - threshold (float): Максимальная дисперсия фона по всем изображениям (оценка, если не все результаты точные).
+    - estimates (dict): {имя файла: результат estimate_background_dispersion}.
+    """
+    bmp_filenames = sorted(get_bmp_filenames(input_folder), key=extract_number)
+    tasks = [(input_folder, bmp_filename, border_width, sample_size, min_coverage, exact)
+             for bmp_filename in bmp_filenames]
+    results = map_images(estimate_image_background, tasks, workers, "Оценка дисперсии фона")
+    estimates = dict(zip(bmp_filenames, results))
+    threshold = max((estimate["max"] for estimate in estimates.values()), default=0.0)
+    return threshold, estimates
+
+
+def print_background_estimates(threshold, estimates):
+    """
+    Выводит результаты estimate_folder_background_dispersion: максимум, 99-й процентиль и покрытие
+    для каждого изображения и порог по каталогу. Максимум выборки подписывается как оценка.
+    """
+    for bmp_filename, estimate in estimates.items():
+        print(f"{bmp_filename}: максимум {estimate['max']:.2f}"
+              + (" (точно)" if estimate["exact"] else " (оценка по выборке)")
+              + f", 99-й процентиль {estimate['percentiles'][99]:.2f}, покрытие {estimate['coverage']:.4f}")
+    if all(estimate["exact"] for estimate in estimates.values()):
+        print(f"Максимальная дисперсия фона по каталогу : {threshold}")
     else:
-        start_index = 0
-    return start_index
+        print(f"Оценка максимальной дисперсии фона по каталогу (максимум выборки, точное значение не меньше): "
+              f"{threshold}")
 
 
-def create_analyzers(input_folder, background_dispersion=20, step_size=4):
+@timed("boundary_batch")
+def create_analyzers(input_folder, background_dispersion=None, step_size=4, workers=None, border_width=None,
+                     output_folder="Output", options=None):
     """
     Создает объекты PixelBrightnessAnalyzer для каждого файла BMP в каталоге Input.
-    Если для какого то из объектов уже есть выходной файл, тогда начинаем со следующего
+    Изображения, которые уже обработаны с теми же параметрами и не изменились (по журналу Output/manifest.jsonl),
+    пропускаются.
     Параметры:
     - input_folder (строка): Путь к каталогу с входными изображениями.
+    - background_dispersion (float): Максимальная дисперсия фона. Если не задана, запрашивается у пользователя.
+    - step_size (int): Шаг между исследуемыми строками и столбцами.
+    - workers (int): Количество параллельных процессов. Если не задано, запрашивается у пользователя.
+    - border_width (int): Ширина неисследуемой области. Если не задана, запрашивается у пользователя.
+    - output_folder (строка): Путь к каталогу для pointsN.txt и журнала.
+    - options (dict): Настройки быстрых путей (см. track_image_points).
     """
-    input_disp= input("Введите максимальную дисперсию фона\n     ")
-    if(input_disp):
-        background_dispersion = int(input_disp)
+    if background_dispersion is None:
+        input_disp = input("Введите максимальную дисперсию фона\n     ")
+        background_dispersion = int(input_disp) if input_disp else 20
 
-    output_list = []
     bmp_filenames = get_bmp_filenames(input_folder)
     bmp_filenames = sorted(bmp_filenames, key=extract_number)  # Сортировка имен файлов
 
-    start_index = get_start_index()
-    border_input = input("Введите ширину области, которая не будет исследована\n     ")
-    # for i in range(start_index + 1, len(bmp_filenames)):
-    for i in tqdm(range(start_index + 1, len(bmp_filenames) + 1), desc="Progress of Analise of Image"):
-        bmp_filename = bmp_filenames[i - 1]
+    if border_width is None:
+        border_input = input("Введите ширину области, которая не будет исследована\n     ")
+        border_width = int(border_input) if border_input else 40
+    workers = get_workers_count(workers)
+    options = dict(options or {}, output_folder=output_folder)
+    manifest = JobManifest(output_folder)
+    params = {"background_dispersion": background_dispersion, "step_size": step_size, "border_width": border_width,
+              "tracker": options.get("tracker", "max")}
+    tasks = []
+    for i, bmp_filename in enumerate(bmp_filenames, start=1):
         image_name = os.path.splitext(bmp_filename)[0]  # Получаем имя файла без расширения
         points_file = f"points{i}.txt"  # Генерируем имя файла для сохранения точек
-        analyzer = ba.PixelBrightnessAnalyzer(input_folder, image_name + ".bmp", points_file, "Output")
-        print(f"Создан объект PixelBrightnessAnalyzer для {bmp_filename}")
-        if(border_input):
-            border_width = int(border_input)
-        else:
-            border_width = 40
-        output_list.append(analyzer.track_max_dispersion_points(background_dispersion, step_size, border_width))
+        if manifest.is_done("boundary", os.path.join(input_folder, bmp_filename), params,
+                            [os.path.join(output_folder, points_file)]):
+            continue
+        tasks.append((input_folder, image_name + ".bmp", points_file, background_dispersion, step_size, border_width,
+                      options))
+    # Каждый процесс пишет свой pointsN.txt, результаты идут в порядке номеров изображений
+    output_list = []
+    for task, result in zip(tasks, imap_images(track_image_points, tasks, workers, "Progress of Analise of Image")):
+        output_list.append(result)
+        manifest.mark_done("boundary", os.path.join(task[0], task[1]), params, [os.path.join(output_folder, task[2])])
     # В зависимости от количества входных файлов меняется количество элементов кортежа output_list
     return output_list
 
 
-def create_and_save_random_points(input_folder, width=40):
+@timed("random_points_batch")
+def create_and_save_random_points(input_folder, width=40, workers=None, output_folder="Output"):
     """
     Создает объекты PixelBrightnessAnalyzer для каждого файла BMP в каталоге Input
     и вызывает метод select_random_points_and_save для каждого анализатора.
+    Изображения, уже обработанные с теми же параметрами (по журналу Output/manifest.jsonl), пропускаются.
 
     Параметры:
     - input_folder (строка): Путь к каталогу с входными изображениями.
-    - background_dispersion (int): Максимальная дисперсия фона.
-    - step_size (int): Размер шага при перемещении по изображению.
+    - width (int): Ширина полоски, из которой выбираются точки.
+    - workers (int): Количество параллельных процессов. Если не задано, запрашивается у пользователя.
+    - output_folder (строка): Путь к каталогу для pointsN.txt и журнала.
     """
     output_list = []
     bmp_filenames = get_bmp_filenames(input_folder)
     bmp_filenames = sorted(bmp_filenames, key=extract_number)  # Сортировка имен файлов
-    start_index = get_start_index()
-
-    for i in tqdm(range(start_index + 1, len(bmp_filenames) + 1), desc="Прогресс анализа изображений"):
-        bmp_filename = bmp_filenames[i - 1]
+    workers = get_workers_count(workers)
+    manifest = JobManifest(output_folder)
+    height = 238
+    params = {"height": height, "width": width}
 
+    tasks = []
+    for i, bmp_filename in enumerate(bmp_filenames, start=1):
         image_name = os.path.splitext(bmp_filename)[0]  # Получаем имя файла без расширения
         points_file = f"points{i}.txt"  # Генерируем имя файла для сохранения точек
-        analyzer = ba.PixelBrightnessAnalyzer(input_folder, image_name + ".bmp", points_file, "Output")
-        print(f"Создан объект PixelBrightnessAnalyzer для {bmp_filename}")
-        height = 238
-        # Вызываем метод select_random_points_and_save для каждого анализатора
-        analyzer.select_random_points_and_save(height, width)
+        if manifest.is_done("background", os.path.join(input_folder, bmp_filename), params,
+                            [os.path.join(output_folder, points_file)]):
+            continue
+        tasks.append((input_folder, image_name + ".bmp", points_file, height, width, output_folder))
+    # Вызываем метод select_random_points_and_save для каждого анализатора
+    for task, _ in zip(tasks, imap_images(save_image_random_points, tasks, workers, "Прогресс анализа изображений")):
+        manifest.mark_done("background", os.path.join(task[0], task[1]), params, [os.path.join(output_folder, task[2])])
 
     return output_list
 
 
-def create_analyzers_from_points_files(output_folder):
+@timed("stream_batch")
+def analyze_images_stream(input_folder="Input", background_dispersion=None, border_width=40, save_folder=None,
+                          step_size=4, output_folder="Output", options=None, workers=1):
+    """
+    Обрезает исходные изображения, переводит их в черно-белый формат и строит points файлы границы
+    в одном проходе, без записи промежуточных BMP (если папка для них не указана).
+
+    Параметры:
+    - input_folder (строка): Путь к каталогу с исходными JPG/BMP изображениями.
+    - background_dispersion (float): Максимальная дисперсия фона. Если не задана, она, ширина области
+      и папка для обработанных изображений запрашиваются у пользователя.
+    - border_width (int): Ширина области, которая не будет исследована.
+    - save_folder (строка): Каталог для сохранения обработанных BMP (None - не сохранять).
+    - step_size (int): Шаг между исследуемыми строками и столбцами.
+    - output_folder (строка): Путь к каталогу для pointsN.txt.
+    - options (dict): Настройки быстрых путей (см. track_image_points).
+    - workers (int): Количество параллельных процессов (каждый обрабатывает свои исходные изображения).
+
+    Возвращает:
+    - output_list (list): Результаты track_max_dispersion_points (или track_contour_points) для каждого изображения.
+    """
+    if background_dispersion is None:
+        input_disp = input("Введите максимальную дисперсию фона\n     ")
+        background_dispersion = int(input_disp) if input_disp else 20
+        border_input = input("Введите ширину области, которая не будет исследована\n     ")
+        border_width = int(border_input) if border_input else 40
+        save_folder = input("Введите папку для сохранения обработанных изображений (Enter - не сохранять)\n     ")
+    tasks = ip.get_stream_tasks(input_folder, background_dispersion, step_size, border_width, output_folder,
+                                save_folder or None, options)
+    return map_images(ip.analyze_source_image, tasks, workers, "Progress of Analise of Image")
+
+
+def create_analyzers_from_points_files(output_folder, input_folder="Input"):
     """
     Создает объекты PixelBrightnessAnalyzer для каждого файла pointsN.txt в каталоге Output.
 
     Параметры:
     - output_folder (строка): Путь к каталогу с файлами pointsN.txt.
+    - input_folder (строка): Путь к каталогу с изображениями ImageN.bmp.
 
     Возвращает:
     - analyzers (list): Список объектов PixelBrightnessAnalyzer.
@@ -146,24 +355,218 @@ def create_analyzers_from_points_files(output_folder):
 
         # Получаем имя изображения и путь к нему
         image_name = f"Image{analyzer_number}.bmp"
-        input_folder = "Input"  # Путь к каталогу с изображениями
 
         # Генерируем имя файла для сохранения точек
         points_file_path = os.path.join(output_folder, points_file)
 
-        # Создаем объект PixelBrightnessAnalyzer
-        analyzer = ba.PixelBrightnessAnalyzer(input_folder, image_name, points_file_path, output_folder)
+        # Создаем объект PixelBrightnessAnalyzer; список живет дольше кэша изображений,
+        # поэтому пиксели копируются и анализаторы не держат открытые отображения файлов
+        analyzer = ba.PixelBrightnessAnalyzer(input_folder, image_name, points_file_path, output_folder,
+                                              copy_pixels=True)
         analyzers.append(analyzer)
 
     return analyzers
 
 
+def get_points_file_images(output_folder):
+    """
+    Получает пары (имя изображения ImageN.bmp, путь к pointsN.txt) для каждого файла pointsN.txt каталога Output.
+
+    В отличие от create_analyzers_from_points_files, изображения не открываются: анализаторы создаются
+    по одному там, где обрабатывается изображение.
+
+    Параметры:
+    - output_folder (строка): Путь к каталогу с файлами pointsN.txt.
+
+    Возвращает:
+    - pairs (list): Пары [(image_name, points_path), ...] в порядке номеров файлов.
+    """
+    # Номер изображения берется из имени pointsN.txt
+    return [(f"Image{os.path.basename(path)[len('points'):-len('.txt')]}.bmp", path)
+            for path in pf.get_points_paths(output_folder)]
+
+
+def fill_f3f5_files(output_folder="Output", input_folder="Input", f3_file="outputF3.txt", f5_file="outputF5.txt",
+                    shard_folder=None, contur_true=1):
+    """
+    Дописывает в файлы F3 и F5 яркость и дисперсию окрестностей точек из всех pointsN.txt каталога output_folder.
+
+    Параметры:
+    - output_folder (строка): Путь к каталогу с файлами pointsN.txt.
+    - input_folder (строка): Путь к каталогу с изображениями ImageN.bmp.
+    - f3_file, f5_file (строки): Имена файлов F3 и F5 (None - не записывать текстовые файлы).
+    - shard_folder (строка): Каталог для двоичных файлов признаков featuresN.npy (None - не записывать).
+    - contur_true (int): Метка точек в файлах признаков: 1 - граница, 0 - фон.
+    """
+    analyzer_list = create_analyzers_from_points_files(output_folder, input_folder)
+    for analyzer in analyzer_list:
+        points_list = analyzer.get_points_from_points_file(analyzer.points_file)
+        tuple = analyzer.fill_lists(points_list)
+        if f3_file is not None:
+            write_tuple_F3_data_to_file(tuple, f3_file)
+        if f5_file is not None:
+            write_tuple_F5_data_to_file(tuple, f5_file)
+        if shard_folder is not None:
+            image_id = extract_number(analyzer.image_name)
+            fs.write_shard(shard_folder, fs.features_from_lists(tuple, image_id, contur_true), image_id)
+
+
+def write_f3f5_shard(tuple_data, shard_folder, image_name):
+    """
+    Записывает признаки одного изображения в отдельные файлы F3 и F5 (outputF3_ImageN.txt, outputF5_ImageN.txt).
+
+    Каждый файл сначала пишется во временный файл и затем переименовывается, поэтому при сбое
+    не остается недописанных файлов, а разные изображения можно обрабатывать параллельно.
+
+    Параметры:
+    - tuple_data (tuple): Результат fill_lists.
+    - shard_folder (строка): Каталог файлов F3/F5 изображений.
+    - image_name (строка): Имя изображения без расширения (ImageN).
+
+    Возвращает:
+    - paths (list): Пути к файлам F3 и F5.
+    """
+    os.makedirs(shard_folder, exist_ok=True)
+    paths = []
+    for prefix, write in (("outputF3", write_tuple_F3_data_to_file), ("outputF5", write_tuple_F5_data_to_file)):
+        path = os.path.join(shard_folder, f"{prefix}_{image_name}.txt")
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        clear_files(temp_path)
+        write(tuple_data, temp_path)
+        os.replace(temp_path, path)
+        paths.append(path)
+    return paths
+
+
+def fill_image_shard(task):
+    """
+    Вычисляет признаки точек pointsN.txt одного изображения и записывает их файлы F3/F5 (задание для пула процессов).
+
+    Параметры:
+    - task (tuple): (input_folder, image_name, points_file, output_folder, shard_folder).
+
+    Возвращает:
+    - image_name (строка): Имя изображения без расширения.
+    """
+    input_folder, image_name, points_file, output_folder, shard_folder = task
+    analyzer = ba.PixelBrightnessAnalyzer(input_folder, image_name, points_file, output_folder)
+    points_list = analyzer.get_points_from_points_file(analyzer.points_file)
+    tuple = analyzer.fill_lists(points_list)
+    name = os.path.splitext(image_name)[0]
+    write_f3f5_shard(tuple, shard_folder, name)
+    return name
+
+
+def fill_f3f5_shards(output_folder="Output", input_folder="Input", shard_folder=None, f3_file="outputF3.txt",
+                     f5_file="outputF5.txt", workers=1):
+    """
+    Заполняет файлы F3 и F5 через файлы отдельных изображений: изображения обрабатываются параллельно,
+    затем файлы объединяются в порядке номеров изображений (merge_f3f5_shards).
+
+    В отличие от fill_f3f5_files, outputF3.txt и outputF5.txt заменяются целиком, предварительная очистка не нужна.
+
+    Параметры:
+    - output_folder (строка): Путь к каталогу с файлами pointsN.txt.
+    - input_folder (строка): Путь к каталогу с изображениями ImageN.bmp.
+    - shard_folder (строка): Каталог файлов F3/F5 изображений (по умолчанию output_folder/F3F5).
+    - f3_file, f5_file (строки): Имена объединенных файлов F3 и F5.
+    - workers (int): Количество параллельных процессов.
+    """
+    if shard_folder is None:
+        shard_folder = os.path.join(output_folder, "F3F5")
+    # Задания составляются по именам файлов, изображения открываются только в процессах пула
+    tasks = [(input_folder, image_name, points_path, output_folder, shard_folder)
+             for image_name, points_path in get_points_file_images(output_folder)]
+    image_names = map_images(fill_image_shard, tasks, workers, "Заполнение F3 F5")
+    merge_f3f5_shards(shard_folder, f3_file, f5_file, image_names)
+
+
+def merge_f3f5_shards(shard_folder, f3_file="outputF3.txt", f5_file="outputF5.txt", image_names=None):
+    """
+    Объединяет файлы F3/F5 изображений в outputF3.txt и outputF5.txt в порядке extract_number.
+
+    Объединенный файл пишется во временный файл и затем переименовывается.
+
+    Параметры:
+    - shard_folder (строка): Каталог файлов F3/F5 изображений.
+    - f3_file, f5_file (строки): Имена объединенных файлов.
+    - image_names (list): Имена изображений (ImageN), которые нужно объединить (None - все файлы каталога).
+    """
+    for prefix, merged_path in (("outputF3", f3_file), ("outputF5", f5_file)):
+        if image_names is None:
+            shards = [file for file in os.listdir(shard_folder)
+                      if file.startswith(prefix + "_Image") and file.endswith(".txt")]
+        else:
+            shards = [f"{prefix}_{image_name}.txt" for image_name in image_names]
+        shards.sort(key=extract_number)
+        temp_path = f"{merged_path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as merged:
+            for shard in shards:
+                with open(os.path.join(shard_folder, shard), "rb") as file:
+                    shutil.copyfileobj(file, merged)
+        os.replace(temp_path, merged_path)
+
+
+def write_image_factors(task):
+    """
+    Записывает файлы factorsN.txt окон 3x3 и 5x5 для точек pointsN.txt одного изображения (задание для пула процессов).
+
+    Файлы пишутся в подкаталоги FACTS3 и FACTS5 (как у программ facts3/facts5) через временный файл.
+
+    Параметры:
+    - task (tuple): (input_folder, image_name, points_file, factors_folder).
+
+    Возвращает:
+    - paths (list): Пути к записанным файлам.
+    """
+    input_folder, image_name, points_file, factors_folder = task
+    analyzer = ba.PixelBrightnessAnalyzer(input_folder, image_name, points_file, factors_folder)
+    points_list = analyzer.get_points_from_points_file(analyzer.points_file)
+    points_list, means_3x3, dispersions_3x3, means_5x5, dispersions_5x5 = analyzer.fill_factor_lists(points_list)
+    factors_name = f"factors{extract_number(image_name)}.txt"
+    paths = []
+    for window_size, means, dispersions in ((3, means_3x3, dispersions_3x3), (5, means_5x5, dispersions_5x5)):
+        folder = os.path.join(factors_folder, f"FACTS{window_size}")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, factors_name)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        analyzer.write_factors_to_file(points_list, means, dispersions, window_size, temp_path)
+        os.replace(temp_path, path)
+        paths.append(path)
+    return paths
+
+
+def create_factors_files(output_folder="Output", input_folder="Input", factors_folder=None, workers=1):
+    """
+    Составляет файлы factorsN.txt для всех pointsN.txt каталога за один проход без программ facts3.exe и facts5.exe.
+
+    Для каждого изображения окна 3x3 и 5x5 считаются за одно чтение points файла,
+    файлы совпадают побайтно с результатом эталонных программ.
+
+    Параметры:
+    - output_folder (строка): Путь к каталогу с файлами pointsN.txt.
+    - input_folder (строка): Путь к каталогу с изображениями ImageN.bmp.
+    - factors_folder (строка): Каталог для подкаталогов FACTS3 и FACTS5 (по умолчанию output_folder).
+    - workers (int): Количество параллельных процессов.
+
+    Возвращает:
+    - paths (list): Пути к записанным файлам.
+    """
+    if factors_folder is None:
+        factors_folder = output_folder
+    # Задания составляются по именам файлов, изображения открываются только в процессах пула
+    tasks = [(input_folder, image_name, points_path, factors_folder)
+             for image_name, points_path in get_points_file_images(output_folder)]
+    return [path for paths in map_images(write_image_factors, tasks, workers, "Файлы factors") for path in paths]
+
+
 def write_array_to_file(array, filename):
     with open(filename, "w") as file:
         for item in array:
             file.write(str(item) + "\n")
 
 
+@timed("write_f3f5")
 def write_tuple_F3_data_to_file(tuple_data, filename):
     """
     Записывает данные из кортежа в файл.
@@ -189,6 +592,7 @@ def write_tuple_F3_data_to_file(tuple_data, filename):
             dispersion = dispersion_list[i]
             file.write(f"{point[0]} {point[1]} {brightness} {dispersion}\n")
 
+@timed("write_f3f5")
 def write_tuple_F5_data_to_file(tuple_data, filename):
     """
     Записывает данные из кортежа в файл.
@@ -231,7 +635,9 @@ def clear_files(*filenames):
 
 
 def clear_console():
-    os.system('cls' if os.name == 'nt' else 'clear')
+    # При выводе в файл или канал escape-последовательности очистки не нужны
+    if sys.stdout.isatty():
+        os.system('cls' if os.name == 'nt' else 'clear')
 
 
 def main_menu():
@@ -243,6 +649,8 @@ def main_menu():
     print("4. Выполнить анализ яркости изображений")
     print("5. Импортировать Точки Границы из txt в exel")
     print("6. Импортировать Точки Фона из txt в exel")
+    print("7. Обрезать, преобразовать и проанализировать изображения без промежуточных файлов")
+    print("8. Экспортировать точки всех изображений в FeaturesTable.xlsx (лист на изображение)")
     print("0. Выход")
 
     choice = input("Введите номер действия: ")
@@ -263,6 +671,11 @@ def main_menu():
         final_EXPORT_DATAF3F5_TO_EXEL(1)
     elif choice == "6":
         final_EXPORT_DATAF3F5_TO_EXEL(0)
+    elif choice == "7":
+        analyze_images_stream("Input")
+    elif choice == "8":
+        contur_input = input("Точки границы (1) или фона (0)?\n     ")
+        export_features_streaming(contur_true=0 if contur_input == "0" else 1)
     elif choice == "0":
         print("До свидания!")
         exit()
@@ -283,9 +696,17 @@ def analyze_brightness_menu():
 
     if choice == "1":
         border_width = int(input("Введите ширину исследуемой сверху области\n     "))
-        analyze = ba.PixelBrightnessAnalyzer("Input")
-        analyze.save_explored_area(border_width)
-        print(f"Максимальная дисперсия фона : {analyze.get_background_dispersion(border_width)}")
+        all_images = input("Оценить по всем изображениям каталога Input? (y - да, Enter - только Image1)\n     ")
+        if all_images.lower() == "y":
+            workers = get_workers_count()
+            # Порог передается трекерам, поэтому нужен точный максимум, а не максимум выборки
+            threshold, estimates = estimate_folder_background_dispersion("Input", border_width, workers=workers,
+                                                                         exact=True)
+            print_background_estimates(threshold, estimates)
+        else:
+            analyze = ba.PixelBrightnessAnalyzer("Input")
+            analyze.save_explored_area(border_width)
+            print(f"Максимальная дисперсия фона : {analyze.get_background_dispersion_exact(border_width)}")
         input("Для продолжения нажмите Enter...")
     elif choice == "2":
         input_folder = "Input"
@@ -294,12 +715,7 @@ def analyze_brightness_menu():
         clear_files("outputF3.txt", "outputF5.txt")
         input("Для продолжения нажмите Enter...")
     elif choice == "4":
-        analyzer_list = create_analyzers_from_points_files("Output")
-        for analyzer in analyzer_list:
-            points_list = analyzer.get_points_from_points_file(analyzer.points_file)
-            tuple = analyzer.fill_lists(points_list)
-            write_tuple_F3_data_to_file(tuple, "outputF3.txt")
-            write_tuple_F5_data_to_file(tuple, "outputF5.txt")
+        fill_f3f5_files("Output")
         input("Для продолжения нажмите Enter...")
     elif choice == "5":
         input_folder = "Input"
@@ -332,79 +748,263 @@ def read_data_from_file(filename):
     return data
 
 
-def final_EXPORT_DATAF3F5_TO_EXEL(contur_true, exel_file="CopyOfWorkTable.xlsx"):
+@timed("excel_export")
+def final_EXPORT_DATAF3F5_TO_EXEL(contur_true, exel_file="CopyOfWorkTable.xlsx", f3_file="outputF3.txt",
+                                  f5_file="outputF5.txt"):
     """
     Заполняет таблицу значениями из outputF3.txt и outputF5.txt
     contur_true - если 1 то граница, если 0 то фон
     :param exel_file: ,
+    :param f3_file, f5_file: файлы F3 и F5
     :return:
     """
-    input_folder = "Input"
-    output_folder = "Output"
-    image_name = "Image1.bmp"
-    points_file = "points1.txt"
-    # Генерируем имя файла для сохранения точек
-    points_file_path = os.path.join(output_folder, points_file)
-    # Создаем объект PixelBrightnessAnalyzer
-    analyzer = ba.PixelBrightnessAnalyzer(input_folder, image_name, points_file_path, output_folder)
-    data = read_data_from_file("outputF3.txt")
+    data = read_data_from_file(f3_file)
     ex = ExcelHandler(exel_file)
-    data_addition = read_data_from_file("outputF5.txt")
-
-    # Заполняем точки границы
-    if (contur_true == 1):
-        # X
-        list_input = [data[i][0][0] for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 1, 4, 489)
-        # Y
-        list_input = [data[i][0][1] for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 2, 4, 489)
-        # M3
-        list_input = [int(data[i][1]) for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 3, 4, 489)
-        # D3
-        list_input = [int(data[i][2]) for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 4, 4, 489)
-
-        # M5
-        list_input = [int(data_addition[i][1]) for i in
-                      range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 5, 4, 489)
-        # D5
-        list_input = [int(data_addition[i][2]) for i in
-                      range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 6, 4, 489)
-        N = 489 - 4 + 1
-        list_last_column = [1] * N
-        ex.fill_column(list_last_column, 7, 4, 489)
-    # Заполняем точки фона
-    if (contur_true == 0):
-        # X
-        list_input = [data[i][0][0] for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 1, 490, 983)
-        # Y
-        list_input = [data[i][0][1] for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 2, 490, 983)
-        # M3
-        list_input = [int(data[i][1]) for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 3, 490, 983)
-        # D3
-        list_input = [int(data[i][2]) for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 4, 490, 983)
-
-        # M5
-        list_input = [int(data_addition[i][1]) for i in
-                      range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 5, 490, 983)
-        # D5
-        list_input = [int(data_addition[i][2]) for i in
-                      range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 6, 490, 983)
-        N = 983 - 490 + 1
-        list_last_column = [0] * N
-        ex.fill_column(list_last_column, 7, 490, 983)
+    data_addition = read_data_from_file(f5_file)
+
+    # Точки границы занимают строки 4-489 (метка 1), точки фона - строки 490-983 (метка 0)
+    if contur_true == 1:
+        start_row, end_row = 4, 489
+    elif contur_true == 0:
+        start_row, end_row = 490, 983
+    else:
+        return
+    N = end_row - start_row + 1
+    # Все колонки записываются за одно открытие и сохранение таблицы
+    columns = {
+        1: [data[i][0][0] for i in range(len(data))],  # X
+        2: [data[i][0][1] for i in range(len(data))],  # Y
+        3: [int(data[i][1]) for i in range(len(data))],  # M3
+        4: [int(data[i][2]) for i in range(len(data))],  # D3
+        5: [int(data_addition[i][1]) for i in range(len(data))],  # M5
+        6: [int(data_addition[i][2]) for i in range(len(data))],  # D5
+        7: [contur_true] * N,
+    }
+    ex.fill_columns(columns, start_row, end_row)
+
+
+def iterate_feature_blocks(output_folder="Output", input_folder="Input", contur_true=1):
+    """
+    Генератор: для каждого файла pointsN.txt выдает строки таблицы признаков соответствующего изображения.
+
+    Строки вычисляются по одному изображению, поэтому в памяти находится только текущее изображение.
+
+    Параметры:
+    - output_folder (строка): Путь к каталогу с файлами pointsN.txt.
+    - input_folder (строка): Путь к каталогу с изображениями ImageN.bmp.
+    - contur_true (int): Метка точек: 1 - граница, 0 - фон.
+
+    Возвращает (по одному):
+    - (имя изображения, строки): Строки [X, Y, M3, D3, M5, D5, метка].
+    """
+    for image_name, points_path in get_points_file_images(output_folder):
+        # Анализатор создается только для текущего изображения
+        analyzer = ba.PixelBrightnessAnalyzer(input_folder, image_name, points_path, output_folder)
+        points_list = analyzer.get_points_from_points_file(analyzer.points_file)
+        points, mean3, dispersion3, mean5, dispersion5 = analyzer.fill_lists(points_list)
+        rows = ([x, y, int(m3), int(d3), int(m5), int(d5), contur_true]
+                for (x, y), m3, d3, m5, d5 in zip(points, mean3, dispersion3, mean5, dispersion5))
+        yield os.path.splitext(analyzer.image_name)[0], rows
+
+
+@timed("excel_export")
+def export_features_streaming(excel_file="FeaturesTable.xlsx", output_folder="Output", input_folder="Input",
+                              contur_true=1, sheet_per_image=True, template_file=EXCEL_TEMPLATE):
+    """
+    Экспортирует признаки точек всех изображений в таблицу Excel в потоковом режиме (openpyxl write-only).
+
+    В отличие от final_EXPORT_DATAF3F5_TO_EXEL, количество строк не ограничено строками 4-983 шаблона:
+    каждое изображение записывается на свой лист (или отдельным блоком строк на одном листе),
+    заголовок (строки 1-3) и ширина колонок копируются из шаблона.
+
+    Параметры:
+    - excel_file (строка): Создаваемая таблица (перезаписывается).
+    - output_folder (строка): Путь к каталогу с файлами pointsN.txt.
+    - input_folder (строка): Путь к каталогу с изображениями ImageN.bmp.
+    - contur_true (int): Метка точек: 1 - граница, 0 - фон.
+    - sheet_per_image (bool): True - по листу на изображение, False - все изображения на одном листе
+      (имя изображения - в колонке H).
+    - template_file (строка): Шаблон таблицы (None - без заголовка).
+    """
+    if template_file is not None and not os.path.exists(template_file):
+        template_file = None
+    ex = ExcelHandler(excel_file)
+    ex.write_streaming(iterate_feature_blocks(output_folder, input_folder, contur_true), template_file,
+                       sheet_per_block=sheet_per_image)
 ###################################################
 
-# Основной цикл программы
-while True:
-    main_menu()
+
+def build_argument_parser():
+    """
+    Создает разбор аргументов командной строки для пакетной обработки без меню.
+
+    Возвращает:
+    argparse.ArgumentParser: Разбор аргументов с командами crop, convert, rename, background, analyze,
+    random-points, fill, merge, factors, export, export-stream, stream и all.
+    """
+    parser = argparse.ArgumentParser(description="Пакетная обработка изображений без интерактивного меню. "
+                                                 "Без аргументов запускается меню.")
+    parser.add_argument("--stats", action="store_true", help="собрать счетчики и время этапов и вывести сводку")
+    parser.add_argument("--stats-file", metavar="FILE.json", help="собрать счетчики и время этапов и записать в файл")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    folders = argparse.ArgumentParser(add_help=False)
+    folders.add_argument("--input", default="Input", help="каталог с изображениями (по умолчанию Input)")
+    folders.add_argument("--output", default="Output", help="каталог для pointsN.txt (по умолчанию Output)")
+    folders.add_argument("--workers", type=int, default=1, help="количество параллельных процессов")
+
+    analysis = argparse.ArgumentParser(add_help=False)
+    analysis.add_argument("--background-dispersion", type=float, default=20, help="максимальная дисперсия фона")
+    analysis.add_argument("--step", type=int, default=4, help="шаг между исследуемыми строками и столбцами")
+    analysis.add_argument("--border", type=int, default=40, help="ширина области, которая не будет исследована")
+    analysis.add_argument("--tracker", choices=["max", "contour"], default="max",
+                          help="max - полный проход строк, contour - следование по контуру")
+    analysis.add_argument("--cache-folder", default=MAP_CACHE_FOLDER, help="каталог дискового кэша карт дисперсии")
+    analysis.add_argument("--no-cache", action="store_true", help="не использовать дисковый кэш карт")
+    analysis.add_argument("--tile-size", type=int, help="считать карты дисперсии по плиткам этого размера")
+    analysis.add_argument("--tile-workers", type=int, default=1, help="количество потоков для плиток")
+
+    output_files = argparse.ArgumentParser(add_help=False)
+    output_files.add_argument("--f3", default="outputF3.txt", help="файл F3")
+    output_files.add_argument("--f5", default="outputF5.txt", help="файл F5")
+
+    export = argparse.ArgumentParser(add_help=False)
+    export.add_argument("--excel-file", default="CopyOfWorkTable.xlsx", help="таблица Excel")
+    export.add_argument("--background-points", action="store_true",
+                        help="экспортировать точки фона (строки 490-983) вместо точек границы")
+
+    cropping = argparse.ArgumentParser(add_help=False)
+    cropping.add_argument("--reduce", type=int, choices=[1, 2, 4, 8], default=1,
+                          help="декодировать JPEG в уменьшенном в N раз размере перед обрезкой. МЕНЯЕТ РЕЗУЛЬТАТ: "
+                               "область 360x240 вырезается из уменьшенного кадра и охватывает в N раз большую "
+                               "часть сцены, чем при обрезке без уменьшения (по умолчанию 1 - без уменьшения)")
+    cropping.add_argument("--force", action="store_true", help="обрезать заново уже обрезанные изображения")
+
+    commands.add_parser("crop", parents=[folders, cropping], help="обрезать изображения и переименовать их в ImageN")
+    commands.add_parser("convert", parents=[folders], help="преобразовать изображения в черно-белый формат")
+    commands.add_parser("rename", parents=[folders], help="переименовать изображения в ImageN")
+    background = commands.add_parser("background", parents=[folders], help="оценить дисперсию фона по каталогу")
+    background.add_argument("--band", type=int, default=80, help="ширина исследуемой сверху области")
+    background.add_argument("--sample-size", type=int, default=2000, help="количество точек выборки на изображение")
+    background.add_argument("--min-coverage", type=float, help="покрытие, ниже которого выполняется точный проход")
+    background.add_argument("--exact", action="store_true", help="вычислить точный максимум по всей области")
+    commands.add_parser("analyze", parents=[folders, analysis], help="составить points файлы границы")
+    random_points = commands.add_parser("random-points", parents=[folders], help="составить points файлы фона")
+    random_points.add_argument("--width", type=int, default=80, help="ширина полоски, из которой выбираются точки")
+    fill = commands.add_parser("fill", parents=[folders, output_files], help="заполнить файлы F3 и F5")
+    fill.add_argument("--append", action="store_true", help="дописать в файлы F3 и F5 (без файлов изображений)")
+    fill.add_argument("--shard-folder", help="также записать двоичные файлы признаков featuresN.npy в этот каталог")
+    fill.add_argument("--background-points", action="store_true", help="метка точек фона (0) в файлах признаков")
+    merge = commands.add_parser("merge", parents=[folders, output_files],
+                                help="объединить файлы F3/F5 изображений из Output/F3F5 в outputF3.txt и outputF5.txt")
+    merge.add_argument("--shard-folder", help="каталог файлов F3/F5 изображений")
+    factors = commands.add_parser("factors", parents=[folders],
+                                  help="составить файлы factorsN.txt окон 3x3 и 5x5 (как facts3.exe и facts5.exe)")
+    factors.add_argument("--factors-folder", help="каталог для FACTS3 и FACTS5 (по умолчанию --output)")
+    commands.add_parser("export", parents=[output_files, export], help="экспортировать F3 и F5 в таблицу Excel")
+    export_stream = commands.add_parser("export-stream", parents=[folders],
+                                        help="экспортировать признаки всех изображений в отдельную таблицу")
+    export_stream.add_argument("--excel-file", default="FeaturesTable.xlsx", help="создаваемая таблица Excel")
+    export_stream.add_argument("--background-points", action="store_true", help="точки фона (метка 0)")
+    export_stream.add_argument("--single-sheet", action="store_true",
+                               help="все изображения на одном листе вместо листа на изображение")
+    stream = commands.add_parser("stream", parents=[folders, analysis],
+                                 help="обрезать, преобразовать и проанализировать без промежуточных файлов")
+    stream.add_argument("--save-folder", help="каталог для сохранения обработанных BMP")
+    commands.add_parser("all", parents=[folders, cropping, analysis, output_files, export],
+                        help="обрезать, преобразовать, проанализировать, заполнить F3/F5 и экспортировать")
+    return parser
+
+
+def run_command(args):
+    """
+    Выполняет команду командной строки.
+
+    Параметры:
+    - args (argparse.Namespace): Результат разбора build_argument_parser.
+    """
+    options = {}
+    if hasattr(args, "tracker"):
+        options = {"tracker": args.tracker, "cache_folder": None if args.no_cache else args.cache_folder,
+                   "tile_size": args.tile_size, "tile_workers": args.tile_workers}
+
+    if args.command in ("crop", "all"):
+        cropper = ic.ImageCropper(args.input, args.input)
+        cropper.crop_images(args.workers, not args.force, args.reduce)
+        cropper.rename_output_images("Image")
+    if args.command == "rename":
+        ic.ImageCropper(args.input, args.input).rename_output_images("Image")
+    if args.command in ("convert", "all"):
+        bwc.BlackAndWhiteConverter(args.input, args.input).convert_to_black_and_white()
+    if args.command == "background":
+        threshold, estimates = estimate_folder_background_dispersion(args.input, args.band, args.sample_size,
+                                                                     args.min_coverage, args.workers, args.exact)
+        print_background_estimates(threshold, estimates)
+    if args.command in ("analyze", "all"):
+        create_analyzers(args.input, args.background_dispersion, args.step, args.workers, args.border, args.output,
+                         options)
+    if args.command == "random-points":
+        create_and_save_random_points(args.input, args.width, args.workers, args.output)
+    if args.command == "stream":
+        analyze_images_stream(args.input, args.background_dispersion, args.border, args.save_folder, args.step,
+                              args.output, options, args.workers)
+    if args.command in ("fill", "all"):
+        if getattr(args, "append", False) or getattr(args, "shard_folder", None):
+            fill_f3f5_files(args.output, args.input, args.f3, args.f5, args.shard_folder,
+                            0 if args.background_points else 1)
+        else:
+            # Файлы изображений пишутся параллельно и объединяются, F3 и F5 заменяются целиком
+            fill_f3f5_shards(args.output, args.input, None, args.f3, args.f5, args.workers)
+    if args.command == "merge":
+        merge_f3f5_shards(args.shard_folder or os.path.join(args.output, "F3F5"), args.f3, args.f5)
+    if args.command == "factors":
+        create_factors_files(args.output, args.input, args.factors_folder, args.workers)
+    if args.command in ("export", "all"):
+        final_EXPORT_DATAF3F5_TO_EXEL(0 if args.background_points else 1, args.excel_file, args.f3, args.f5)
+    if args.command == "export-stream":
+        export_features_streaming(args.excel_file, args.output, args.input, 0 if args.background_points else 1,
+                                  not args.single_sheet)
+
+
+def run_cli(argv):
+    """
+    Точка входа командной строки.
+
+    Параметры:
+    - argv (list): Аргументы командной строки без имени программы.
+
+    Возвращает:
+    int: Код завершения.
+    """
+    args = build_argument_parser().parse_args(argv)
+    if args.stats or args.stats_file:
+        instrumentation.enable()
+    run_command(args)
+    if args.stats_file:
+        instrumentation.dump(args.stats_file)
+    elif args.stats:
+        print(instrumentation.summary())
+    return 0
+
+
+def report_instrumentation():
+    """
+    Выводит сводку счетчиков и времени этапов или записывает их в файл JSON (по переменной ANALYZER_STATS).
+    """
+    target = os.environ.get(INSTRUMENTATION_VARIABLE)
+    if target and target.endswith(".json"):
+        instrumentation.dump(target)
+        print(f"Счетчики записаны в {target}")
+    else:
+        print(instrumentation.summary())
+
+
+# Основной цикл программы (под защитой __main__, чтобы дочерние процессы пула не запускали меню)
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        sys.exit(run_cli(sys.argv[1:]))
+    if os.environ.get(INSTRUMENTATION_VARIABLE):
+        instrumentation.enable()
+        atexit.register(report_instrumentation)
+    while True:
+        main_menu()
@@ -0,0 +1,133 @@
+import numpy as np
+import os
+
+
+class WindowMapCache:
+    def __init__(self, cache_folder="Cache", max_bytes=512 * 1024 * 1024):
+        """
+        Инициализирует объект WindowMapCache - дисковый кэш карт средней яркости и дисперсии.
+
+        Карты хранятся в .npy файлах и открываются через memmap. Ключ - хэш содержимого изображения
+        и размер окна, поэтому при смене порога дисперсии фона карты не пересчитываются.
+        Когда суммарный размер кэша превышает max_bytes, удаляются давно не использованные карты.
+
+        Параметры:
+        - cache_folder (строка): Путь к каталогу кэша.
+        - max_bytes (int): Максимальный суммарный размер файлов кэша в байтах.
+        """
+        self.cache_folder = cache_folder
+        self.max_bytes = max_bytes
+
+    def get_paths(self, image_hash, window_size):
+        """
+        Возвращает пути к файлам карт средней яркости и дисперсии для ключа.
+        """
+        key = f"{image_hash}_w{window_size}"
+        return (os.path.join(self.cache_folder, f"{key}_mean.npy"),
+                os.path.join(self.cache_folder, f"{key}_dispersion.npy"))
+
+    def get(self, image_hash, window_size):
+        """
+        Загружает карты из кэша.
+
+        Аргументы:
+        - image_hash (строка): Хэш содержимого изображения.
+        - window_size (int): Размер окна.
+
+        Возвращает:
+        - (mean_map, dispersion_map): Карты только для чтения (numpy.memmap) или None, если их нет в кэше.
+        """
+        paths = self.get_paths(image_hash, window_size)
+        try:
+            maps = tuple(np.load(path, mmap_mode="r") for path in paths)
+            # Время последнего использования - для вытеснения давно не использованных карт
+            for path in paths:
+                os.utime(path)
+        except (OSError, ValueError):
+            return None
+        return maps
+
+    def put(self, image_hash, window_size, mean_map, dispersion_map):
+        """
+        Сохраняет карты в кэш и при необходимости вытесняет старые записи.
+
+        Каждый файл пишется во временный файл и затем переименовывается, поэтому параллельные процессы
+        не видят недописанных карт.
+        """
+        os.makedirs(self.cache_folder, exist_ok=True)
+        for path, values in zip(self.get_paths(image_hash, window_size), (mean_map, dispersion_map)):
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as file:
+                np.save(file, values)
+            os.replace(temp_path, path)
+        self.evict()
+
+    def get_or_compute(self, image_hash, window_size, compute):
+        """
+        Возвращает карты из кэша или вычисляет их функцией compute() и сохраняет.
+
+        Возвращает:
+        - (mean_map, dispersion_map)
+        """
+        maps = self.get(image_hash, window_size)
+        if maps is None:
+            maps = compute()
+            self.put(image_hash, window_size, *maps)
+        return maps
+
+    def get_or_fill(self, image_hash, window_size, shape, fill):
+        """
+        Возвращает карты из кэша или заполняет их функцией fill(mean_map, dispersion_map) прямо в файлах кэша.
+
+        Файлы создаются как memmap, поэтому карты большого изображения не держатся в памяти целиком.
+
+        Аргументы:
+        - image_hash (строка): Хэш содержимого изображения.
+        - window_size (int): Размер окна.
+        - shape (tuple): Размеры карт (высота, ширина).
+        - fill: Функция, записывающая карты в переданные массивы.
+
+        Возвращает:
+        - (mean_map, dispersion_map): Карты только для чтения (numpy.memmap).
+        """
+        maps = self.get(image_hash, window_size)
+        if maps is not None:
+            return maps
+        os.makedirs(self.cache_folder, exist_ok=True)
+        paths = self.get_paths(image_hash, window_size)
+        temp_paths = [f"{path}.{os.getpid()}.tmp" for path in paths]
+        outputs = [np.lib.format.open_memmap(temp_path, mode="w+", dtype=np.float64, shape=shape)
+                   for temp_path in temp_paths]
+        fill(*outputs)
+        for output in outputs:
+            output.flush()
+        # Файлы нужно закрыть до переименования
+        del outputs
+        for temp_path, path in zip(temp_paths, paths):
+            os.replace(temp_path, path)
+        self.evict()
+        return self.get(image_hash, window_size)
+
+    def evict(self):
+        """
+        Удаляет давно не использованные файлы, пока размер кэша больше max_bytes.
+        """
+        files = []
+        for file in os.listdir(self.cache_folder):
+            if file.endswith(".npy"):
+                path = os.path.join(self.cache_folder, file)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total_size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                # Файл уже удален другим процессом или открыт (Windows)
+                continue
+            total_size -= size
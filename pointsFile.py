@@ -0,0 +1,108 @@
+import numpy as np
+import os
+import re
+
+# Строка точки в pointsN.txt: "xxxx yyyy\n" - две координаты по 4 цифры
+LINE_WIDTH = 10
+DIGIT_WEIGHTS = np.array([1000, 100, 10, 1], dtype=np.int32)
+
+
+def parse_points(data, dtype=np.int32):
+    """
+    Разбирает содержимое файла pointsN.txt в массив координат.
+
+    Первая строка - количество точек, затем строки "x y". Если все строки точек имеют ширину 4 цифры
+    (как пишет write_points), координаты вычисляются из байтов файла без разбора строк в Python,
+    иначе (другая ширина, перевод строки CRLF, отрицательные числа) числа разбираются общим способом.
+
+    Параметры:
+    - data (bytes): Содержимое файла.
+    - dtype: Тип координат (int32 или int16).
+
+    Возвращает:
+    - points (numpy.ndarray): Массив координат размером N x 2 (столбцы x, y).
+    """
+    header, _, body = data.partition(b"\n")
+    if not header.strip():
+        return np.zeros((0, 2), dtype=dtype)
+    total_points = int(header)
+    rows = np.frombuffer(body, dtype=np.uint8)
+    size = total_points * LINE_WIDTH
+    if len(rows) >= size:
+        rows = rows[:size].reshape(total_points, LINE_WIDTH)
+        digits = rows[:, [0, 1, 2, 3, 5, 6, 7, 8]].astype(np.int32) - ord("0")
+        if ((rows[:, 4] == ord(" ")).all() and (rows[:, 9] == ord("\n")).all()
+                and ((digits >= 0) & (digits <= 9)).all()):
+            return np.column_stack((digits[:, :4] @ DIGIT_WEIGHTS, digits[:, 4:] @ DIGIT_WEIGHTS)).astype(dtype)
+    values = np.array(body.split(), dtype=np.int64)
+    if len(values) < 2 * total_points:
+        raise ValueError(f"В файле точек {len(values) // 2} строк, в заголовке указано {total_points}")
+    return values[:2 * total_points].reshape(total_points, 2).astype(dtype)
+
+
+def read_points(file_path, dtype=np.int32):
+    """
+    Читает файл pointsN.txt одним чтением и разбирает его в массив координат N x 2 (см. parse_points).
+    """
+    with open(file_path, "rb") as file:
+        return parse_points(file.read(), dtype)
+
+
+def format_points(points):
+    """
+    Форматирует точки в содержимое файла pointsN.txt: количество точек и строки "x y",
+    числа дополнены нулями до 4 цифр (как str.zfill(4)).
+
+    Координаты от 0 до 9999 переводятся в цифры операциями над массивом,
+    остальные строки форматируются по одной.
+
+    Параметры:
+    - points (array-like): Массив координат размером N x 2.
+
+    Возвращает:
+    - data (bytes): Содержимое файла.
+    """
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    header = f"{str(len(points)).zfill(4)}\n".encode()
+    if not ((points >= 0) & (points <= 9999)).all():
+        return header + "".join(f"{str(x).zfill(4)} {str(y).zfill(4)}\n" for x, y in points.tolist()).encode()
+    rows = np.empty((len(points), LINE_WIDTH), dtype=np.uint8)
+    for column, start in ((0, 0), (1, 5)):
+        values = points[:, column]
+        for position, weight in enumerate(DIGIT_WEIGHTS):
+            rows[:, start + position] = values // weight % 10 + ord("0")
+    rows[:, 4] = ord(" ")
+    rows[:, 9] = ord("\n")
+    return header + rows.tobytes()
+
+
+def write_points(file_path, points):
+    """
+    Записывает точки в файл pointsN.txt одним вызовом write (формат format_points).
+    """
+    with open(file_path, "wb") as file:
+        file.write(format_points(points))
+
+
+def get_points_paths(folder):
+    """
+    Возвращает пути к файлам pointsN.txt каталога в порядке номеров.
+    """
+    points_files = [file for file in os.listdir(folder) if re.fullmatch(r"points\d+\.txt", file)]
+    points_files.sort(key=lambda file: int(re.search(r"\d+", file).group()))
+    return [os.path.join(folder, file) for file in points_files]
+
+
+def read_points_folder(folder, dtype=np.int32):
+    """
+    Читает все файлы pointsN.txt каталога за один проход.
+
+    Параметры:
+    - folder (строка): Каталог с файлами pointsN.txt.
+    - dtype: Тип координат (int32 или int16).
+
+    Возвращает:
+    - points (dict): {N: массив координат N x 2} в порядке номеров файлов.
+    """
+    return {int(re.search(r"\d+", os.path.basename(path)).group()): read_points(path, dtype)
+            for path in get_points_paths(folder)}
@@ -0,0 +1,313 @@
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+import brightnessAnalyzer as ba
+import featureShards as fs
+import main as mn
+from mapCache import WindowMapCache
+
+
+# Эталонные изображения, pointsN.txt и factorsN.txt программ преподавателя
+REFERENCE_FOLDER = "Проги Препода"
+# Пути вычисления F3/F5, которые сравниваются с исходным путем через PIL getpixel
+PATHS = ["getpixel", "slow", "vectorized", "window_maps", "cached_maps", "tiled_maps", "parallel"]
+
+
+def get_reference_image_name(number):
+    """
+    Возвращает имя изображения эксперимента number так, как его выбирают facts3.exe и facts5.exe:
+    эксперименты 6-10 повторно используют изображения 1-5.
+    """
+    return f"Image{number - 5 if number > 5 else number}.bmp"
+
+
+def get_reference_cases(reference_folder=REFERENCE_FOLDER):
+    """
+    Собирает эталонные случаи: каждый factorsN.txt из подкаталогов FACTS3 и FACTS5.
+
+    Координаты точек берутся из самого factorsN.txt: для части файлов (factors2-5) исходные
+    pointsN.txt не сохранились, а в factorsN.txt точки записаны в том же порядке.
+
+    Возвращает:
+    - cases (list): Список словарей {"name", "folder", "image_name", "factors_file"}.
+    """
+    cases = []
+    for window_size in (3, 5):
+        folder = os.path.join(reference_folder, f"FACTS{window_size}")
+        if not os.path.isdir(folder):
+            continue
+        factors_files = [file for file in os.listdir(folder) if re.fullmatch(r"factors\d+\.txt", file)]
+        for factors_file in sorted(factors_files, key=lambda file: int(re.search(r"\d+", file).group())):
+            image_name = get_reference_image_name(int(re.search(r"\d+", factors_file).group()))
+            if os.path.exists(os.path.join(folder, image_name)):
+                cases.append({"name": f"FACTS{window_size}/{factors_file}", "folder": folder,
+                              "image_name": image_name, "factors_file": os.path.join(folder, factors_file)})
+    return cases
+
+
+def getpixel_fill_lists(image_path, points):
+    """
+    Эталонный путь: яркость и дисперсия каждой точки так, как их считала исходная программа -
+    через Image.getpixel изображения, открытого PIL (без кэша изображений, чтения BMP и буфера
+    анализатора). Отрицательные координаты getpixel отсчитывает от края, выход за изображение
+    справа или снизу вызывает IndexError.
+
+    Параметры:
+    - image_path (строка): Путь к изображению.
+    - points (list): Список координат точек [(x1, y1), ...].
+
+    Возвращает:
+    - tuple: (points, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5) как у fill_lists.
+    """
+    def dispersion(values):
+        # Формула dispersion_by_brightness_list исходной программы
+        mean = sum(values) / len(values)
+        return sum((value - mean) ** 2 for value in values) / (len(values) - 1)
+
+    lists = ([], [], [], [])
+    with Image.open(image_path) as image:
+        for x, y in points:
+            for index, radius in ((0, 1), (2, 2)):
+                values = [image.getpixel((x + dx, y + dy))
+                          for dy in range(-radius, radius + 1) for dx in range(-radius, radius + 1)]
+                lists[index].append(sum(values) / len(values))
+                lists[index + 1].append(dispersion(values))
+    return (points,) + lists
+
+
+def slow_fill_lists(analyzer, points):
+    """
+    Медленный путь: яркость и дисперсия каждой точки через попиксельные методы анализатора
+    (так заполнял списки fill_lists до векторизации).
+    """
+    brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5 = [], [], [], []
+    for x, y in points:
+        brightness_list.append(analyzer.analyze_pixel_and_surroundings(x, y, analyzer.image_name))
+        brightness_list_5x5.append(analyzer.analyze_pixel_and_surroundings_25(x, y, analyzer.image_name))
+        dispersion_list.append(analyzer.dispersion_by_brightness_list(
+            analyzer.get_surrounding_pixel_brightness(x, y, analyzer.image_name)))
+        dispersion_list_5x5.append(analyzer.dispersion_by_brightness_list(
+            analyzer.get_surrounding_pixel_brightness_25(x, y, analyzer.image_name)))
+    return points, brightness_list, dispersion_list, brightness_list_5x5, dispersion_list_5x5
+
+
+def window_map_lists(analyzer, points):
+    """
+    Путь через карты средней яркости и дисперсии всего изображения (get_window_maps).
+    """
+    xs = np.array([x for x, _ in points], dtype=np.intp)
+    ys = np.array([y for _, y in points], dtype=np.intp)
+    mean3, dispersion3 = analyzer.get_window_maps(3)
+    mean5, dispersion5 = analyzer.get_window_maps(5)
+    return points, mean3[ys, xs], dispersion3[ys, xs], mean5[ys, xs], dispersion5[ys, xs]
+
+
+def parallel_lists(cases, work_folder, workers=2):
+    """
+    Параллельный путь: points файлы случаев обрабатываются fill_image_shard в пуле процессов,
+    результаты читаются из записанных файлов F3/F5 изображений.
+
+    Возвращает:
+    - lists (list): Кортежи (points, mean3, dispersion3, mean5, dispersion5) в порядке cases.
+    """
+    tasks = []
+    for number, case in enumerate(cases, 1):
+        # У каждого случая свой каталог: разные случаи могут использовать одно изображение
+        case_folder = os.path.join(work_folder, f"case{number}")
+        analyzer = ba.PixelBrightnessAnalyzer(case["folder"], case["image_name"], "points.txt", case_folder)
+        analyzer.write_coordinates_to_file(case["points"])
+        tasks.append((case["folder"], case["image_name"], os.path.join(case_folder, "points.txt"), case_folder,
+                      case_folder))
+    image_names = mn.map_images(mn.fill_image_shard, tasks, workers, "Параллельный путь")
+    lists = []
+    for case, task, image_name in zip(cases, tasks, image_names):
+        features = fs.features_from_text(os.path.join(task[4], f"outputF3_{image_name}.txt"),
+                                         os.path.join(task[4], f"outputF5_{image_name}.txt"))
+        lists.append((case["points"], features["mean3"], features["dispersion3"], features["mean5"],
+                      features["dispersion5"]))
+    return lists
+
+
+def get_max_difference(expected, actual):
+    """
+    Возвращает наибольшее расхождение средних и дисперсий двух результатов fill_lists
+    (бесконечность, если не совпадают точки или количество значений).
+    """
+    if list(map(tuple, expected[0])) != list(map(tuple, actual[0])):
+        return float("inf")
+    difference = 0.0
+    for expected_values, actual_values in zip(expected[1:], actual[1:]):
+        expected_values = np.asarray(expected_values, dtype=np.float64)
+        actual_values = np.asarray(actual_values, dtype=np.float64)
+        if expected_values.shape != actual_values.shape:
+            return float("inf")
+        if len(expected_values):
+            difference = max(difference, float(np.abs(expected_values - actual_values).max()))
+    return difference
+
+
+def factors_from_lists(analyzer, tuple_data, window_size):
+    """
+    Переводит среднюю яркость и дисперсию fill_lists в целые M и D эталонных программ.
+
+    Суммы по окну восстанавливаются из среднего и дисперсии точно (это целые числа) и переводятся
+    в M и D функцией factors_from_sums. Окна у края изображения fill_lists переносит через край,
+    а facts3/facts5 обрезают, поэтому такие точки отмечаются как несравнимые.
+
+    Возвращает:
+    - means, dispersions (numpy.ndarray): Целые M и D.
+    - inside (numpy.ndarray): Маска точек, окно которых целиком внутри изображения.
+    """
+    points = np.asarray(tuple_data[0], dtype=np.intp).reshape(-1, 2)
+    index = 1 if window_size == 3 else 3
+    mean = np.asarray(tuple_data[index], dtype=np.float64)
+    dispersion = np.asarray(tuple_data[index + 1], dtype=np.float64)
+    count = window_size * window_size
+    sums = np.rint(mean * count)
+    square_sums = np.rint(dispersion * (count - 1) + sums * sums / count)
+    means, dispersions = ba.factors_from_sums(sums.astype(np.int64), square_sums.astype(np.int64), count)
+    height, width = analyzer.pixels.shape[:2]
+    radius = window_size // 2
+    inside = ((points[:, 0] >= radius) & (points[:, 0] < width - radius)
+              & (points[:, 1] >= radius) & (points[:, 1] < height - radius))
+    return means, dispersions, inside
+
+
+def check_case(case, work_folder, tolerance=1e-9, factors_tolerance=0):
+    """
+    Проверяет один эталонный случай всеми путями, кроме параллельного. Пути сравниваются
+    с исходным путем через PIL getpixel (getpixel_fill_lists).
+
+    Параметры:
+    - case (dict): Случай из get_reference_cases, дополненный точками ("points") и эталонными M и D.
+    - work_folder (строка): Каталог для дискового кэша карт.
+    - tolerance (float): Допустимое расхождение средних и дисперсий путей с путем через getpixel.
+    - factors_tolerance (int): Допустимое расхождение M и D с эталонным factorsN.txt.
+
+    Возвращает:
+    - result (dict): Время путей, расхождения и список ошибок ("failures").
+    """
+    points = case["points"]
+    window_size = case["window_size"]
+    timings, differences, failures = {}, {}, []
+
+    def timed_path(name, function):
+        start = time.perf_counter()
+        result = function()
+        timings[name] = time.perf_counter() - start
+        return result
+
+    reference = timed_path("getpixel", lambda: getpixel_fill_lists(
+        os.path.join(case["folder"], case["image_name"]), points))
+    analyzer = ba.PixelBrightnessAnalyzer(case["folder"], case["image_name"], "points.txt", work_folder)
+    fast = {"slow": timed_path("slow", lambda: slow_fill_lists(analyzer, points)),
+            "vectorized": timed_path("vectorized", lambda: analyzer.fill_lists(points)),
+            "window_maps": timed_path("window_maps", lambda: window_map_lists(
+                ba.PixelBrightnessAnalyzer(case["folder"], case["image_name"]), points))}
+    # Первый анализатор заполняет кэш, второй читает карты из файлов
+    cache = WindowMapCache(os.path.join(work_folder, "Cache"))
+    window_map_lists(ba.PixelBrightnessAnalyzer(case["folder"], case["image_name"], map_cache=cache), points)
+    fast["cached_maps"] = timed_path("cached_maps", lambda: window_map_lists(
+        ba.PixelBrightnessAnalyzer(case["folder"], case["image_name"], map_cache=cache), points))
+    fast["tiled_maps"] = timed_path("tiled_maps", lambda: window_map_lists(
+        ba.PixelBrightnessAnalyzer(case["folder"], case["image_name"], tile_size=64, tile_workers=2), points))
+    for name, lists in fast.items():
+        differences[name] = get_max_difference(reference, lists)
+        if differences[name] > tolerance:
+            failures.append(f"{case['name']}: путь {name} расходится с getpixel на {differences[name]:.3g}")
+
+    # Точное воспроизведение facts3/facts5: значения и файл целиком
+    means, dispersions = timed_path("factors", lambda: analyzer.get_factors(points, window_size))
+    factors_difference = int(max(np.abs(means - case["means"]).max(initial=0),
+                                 np.abs(dispersions - case["dispersions"]).max(initial=0)))
+    if factors_difference > factors_tolerance:
+        failures.append(f"{case['name']}: M/D расходятся с эталоном на {factors_difference}")
+    factors_path = os.path.join(work_folder, "factors.txt")
+    analyzer.write_factors_to_file(points, means, dispersions, window_size, factors_path)
+    with open(factors_path, "rb") as file, open(case["factors_file"], "rb") as reference:
+        same_file = file.read() == reference.read()
+    if not same_file:
+        failures.append(f"{case['name']}: файл factors отличается от эталонного")
+
+    # M и D, полученные из признаков F3/F5, для точек вдали от края
+    list_means, list_dispersions, inside = factors_from_lists(analyzer, fast["vectorized"], window_size)
+    features_difference = int(max(np.abs(list_means - case["means"])[inside].max(initial=0),
+                                  np.abs(list_dispersions - case["dispersions"])[inside].max(initial=0)))
+    if features_difference > factors_tolerance:
+        failures.append(f"{case['name']}: F{window_size} расходится с эталоном на {features_difference}")
+    return {"name": case["name"], "points": len(points), "timings": timings, "differences": differences,
+            "factors_difference": factors_difference, "same_file": same_file,
+            "features_difference": features_difference, "edge_points": int((~inside).sum()), "failures": failures}
+
+
+def run_check(reference_folder=REFERENCE_FOLDER, tolerance=1e-9, factors_tolerance=0, workers=2):
+    """
+    Проверяет все эталонные случаи и замеряет время каждого пути.
+
+    Возвращает:
+    - results (dict): Результаты в формате JSON: случаи, суммарное время путей ("totals") и ошибки ("failures").
+    """
+    cases = get_reference_cases(reference_folder)
+    reader = ba.workWithFiles()
+    for case in cases:
+        case["points"], case["means"], case["dispersions"], case["window_size"] = \
+            reader.read_factors_file(case["factors_file"])
+    results = []
+    with tempfile.TemporaryDirectory() as work_folder:
+        for case in cases:
+            results.append(check_case(case, work_folder, tolerance, factors_tolerance))
+        start = time.perf_counter()
+        parallel = parallel_lists(cases, work_folder, workers)
+        parallel_seconds = time.perf_counter() - start
+    failures = [failure for result in results for failure in result["failures"]]
+    for case, result, lists in zip(cases, results, parallel):
+        # Параллельный путь сравнивается с тем же эталоном через текст F3/F5
+        reference = getpixel_fill_lists(os.path.join(case["folder"], case["image_name"]), case["points"])
+        result["differences"]["parallel"] = get_max_difference(reference, lists)
+        if result["differences"]["parallel"] > tolerance:
+            failures.append(f"{case['name']}: путь parallel расходится с getpixel на "
+                            f"{result['differences']['parallel']:.3g}")
+    totals = {name: sum(result["timings"].get(name, 0.0) for result in results) for name in PATHS + ["factors"]}
+    totals["parallel"] = parallel_seconds
+    return {"tolerance": tolerance, "factors_tolerance": factors_tolerance, "workers": workers,
+            "cases": results, "totals": totals, "failures": failures}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Сравнение F3/F5 и factorsN.txt с эталонными файлами "
+                                                 "программ facts3/facts5 и проверка быстрых путей")
+    parser.add_argument("--reference", default=REFERENCE_FOLDER, help="каталог с подкаталогами FACTS3 и FACTS5")
+    parser.add_argument("--tolerance", type=float, default=1e-9,
+                        help="допустимое расхождение средних и дисперсий путей с путем через PIL getpixel")
+    parser.add_argument("--factors-tolerance", type=int, default=0, help="допустимое расхождение M и D с эталоном")
+    parser.add_argument("--workers", type=int, default=2, help="количество процессов параллельного пути")
+    parser.add_argument("--output", help="файл для результатов в формате JSON")
+    args = parser.parse_args(argv)
+
+    results = run_check(args.reference, args.tolerance, args.factors_tolerance, args.workers)
+    for result in results["cases"]:
+        status = "ошибка" if result["failures"] else "ок"
+        print(f"{result['name']}: {result['points']} точек, {status}, "
+              f"M/D {result['factors_difference']}, F3/F5 {result['features_difference']} "
+              f"(у края {result['edge_points']}), "
+              f"расхождение путей с getpixel {max(result['differences'].values()):.3g}")
+    print("Время путей: " + ", ".join(f"{name} {seconds * 1000:.1f} мс"
+                                      for name, seconds in results["totals"].items()))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+    for failure in results["failures"]:
+        print(f"Расхождение: {failure}")
+    if not results["failures"]:
+        print("Все пути совпадают с эталоном")
+    return 1 if results["failures"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,9 @@
 from PIL import Image
 import os
 from ExcelHandler import ExcelHandler
-import brightnessAnalyzer as ba
+from instrumentation import instrumentation
 import numpy as np
+import pointsFile as pf
 import matplotlib.pyplot as plt
 
 
@@ -15,19 +16,9 @@ class workWithFiles():
         Возвращает:
         - points (list): Список координат точек.
         """
-        points = []
-        file_path = points_file
-        # Открываем файл pointsN.txt
-        with open(file_path, "r") as file:
-            # Читаем строки из файла
-            lines = file.readlines()
-            # Начиная со второй строки, обрабатываем каждую строку
-            for line in lines[1:]:
-                # Разбиваем строку на координаты x и y
-                x, y = map(int, line.strip().split())
-                points.append((x, y))
-
-        return points
+        # Файл разбирается целиком в массив N x 2 (pointsFile.read_points), без разбора строк в Python
+        points = pf.read_points(points_file)
+        return list(zip(points[:, 0].tolist(), points[:, 1].tolist()))
 
 
     def get_points_from_file(self, file_name):
@@ -124,12 +115,62 @@ class workWithFiles():
         os.makedirs(os.path.join(os.getcwd(), self.output_folder), exist_ok=True)
 
         print(f"Данные запишем в файл {file_path}")
-        with open(file_path, "w") as file:
-            file.write(f"{str(total_points).zfill(4)}\n")
-            for coord in coordinates:
-                x_str = str(coord[0]).zfill(4)  # Добавляем нули спереди до 4 цифр
-                y_str = str(coord[1]).zfill(4)  # Добавляем нули спереди до 4 цифр
-                file.write(f"{x_str} {y_str}\n")
+        instrumentation.count("points_emitted", total_points)
+        # Координаты дополняются нулями до 4 цифр, файл пишется одним вызовом write
+        pf.write_points(file_path, coordinates)
+
+    def write_factors_to_file(self, points, means, dispersions, window_size, file_path):
+        """
+        Записывает файл factorsN.txt в формате программ facts3/facts5.
+
+        Первая строка - количество точек и размер окна, затем строки "x y M  D" (числа дополнены нулями
+        до 4 цифр, как в write_coordinates_to_file), последняя строка - средние M и D по всем точкам.
+        Файл пишется одним вызовом write в UTF-8 с переводами строк LF, как у эталонных программ.
+
+        Аргументы:
+        - points (list): Список координат точек.
+        - means, dispersions (array-like): Целые M и D для каждой точки (результат get_factors).
+        - window_size (int): Размер окна (3 или 5).
+        - file_path (str): Путь к файлу factorsN.txt.
+
+        Возвращает:
+        None
+        """
+        total_points = len(points)
+        means = np.asarray(means, dtype=np.int64)
+        dispersions = np.asarray(dispersions, dtype=np.int64)
+        lines = [f"{str(total_points).zfill(4)} {str(window_size).zfill(4)}\n"]
+        for (x, y), mean, dispersion in zip(points, means.tolist(), dispersions.tolist()):
+            lines.append(f"{str(x).zfill(4)} {str(y).zfill(4)} {str(mean).zfill(4)}  {str(dispersion).zfill(4)}\n")
+        # Средние по точкам эталонные программы тоже делят в float32 и отбрасывают дробную часть
+        if total_points:
+            mean_total = int(np.float32(means.sum()) / np.float32(total_points))
+            dispersion_total = int(np.float32(dispersions.sum()) / np.float32(total_points))
+        else:
+            mean_total = dispersion_total = 0
+        lines.append(f"Средние значения: M= {str(mean_total).zfill(4)} D = {str(dispersion_total).zfill(4)}\n")
+        with open(file_path, "w", encoding="utf-8", newline="\n") as file:
+            file.write("".join(lines))
+
+    def read_factors_file(self, file_path):
+        """
+        Читает файл factorsN.txt в формате программ facts3/facts5.
+
+        Аргументы:
+        - file_path (str): Путь к файлу factorsN.txt.
+
+        Возвращает:
+        - points (list): Список координат точек [(x1, y1), ...].
+        - means, dispersions (numpy.ndarray): Целые M и D для каждой точки.
+        - window_size (int): Размер окна из заголовка.
+        """
+        with open(file_path, "r", encoding="utf-8") as file:
+            lines = file.read().split("\n")
+        total_points, window_size = map(int, lines[0].split())
+        # Строки точек идут сразу за заголовком, строка средних значений не читается
+        rows = np.array([line.split() for line in lines[1:total_points + 1]], dtype=np.int64).reshape(-1, 4)
+        points = list(zip(rows[:, 0].tolist(), rows[:, 1].tolist()))
+        return points, rows[:, 2], rows[:, 3], window_size
 
 
 
@@ -208,36 +249,19 @@ class workWithFiles():
         :param exel_file:
         :return:
         """
-        input_folder = "Input"
-        output_folder = "Output"
-        image_name = "Image1.bmp"
-        points_file = "points1.txt"
-        # Генерируем имя файла для сохранения точек
-        points_file_path = os.path.join(output_folder, points_file)
-        # Создаем объект PixelBrightnessAnalyzer
-        analyzer = ba.PixelBrightnessAnalyzer(input_folder, image_name, points_file_path, output_folder)
-
         data = self.read_data_from_file("outputF3.txt")
         ex = ExcelHandler(exel_file)
-        # X
-        list_input = [data[i][0][0] for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 1, 4, 983)
-        # Y
-        list_input = [data[i][0][1] for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 2, 4, 983)
-        # M3
-        list_input = [int(data[i][1]) for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 3, 4, 983)
-        # D3
-        list_input = [int(data[i][2]) for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 4, 4, 983)
         data_addition = self.read_data_from_file("outputF5.txt")
-        # M5
-        list_input = [int(data_addition[i][1]) for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 5, 4, 983)
-        # D5
-        list_input = [int(data_addition[i][2]) for i in range(len(data))]  # Берем значения из первой координаты точки
-        ex.fill_column(list_input, 6, 4, 983)
+        # Все колонки записываются за одно открытие и сохранение таблицы
+        columns = {
+            1: [data[i][0][0] for i in range(len(data))],  # X
+            2: [data[i][0][1] for i in range(len(data))],  # Y
+            3: [int(data[i][1]) for i in range(len(data))],  # M3
+            4: [int(data[i][2]) for i in range(len(data))],  # D3
+            5: [int(data_addition[i][1]) for i in range(len(data))],  # M5
+            6: [int(data_addition[i][2]) for i in range(len(data))],  # D5
+        }
+        ex.fill_columns(columns, 4, 983)
 
     def read_data_from_file(self, filename):
         """